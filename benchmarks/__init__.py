@@ -0,0 +1,38 @@
+"""
+Micro-benchmarks for resticus' hot paths.
+
+Run them from the repository root, eg.::
+
+    python -m benchmarks.bench_serialization
+
+They use the test project settings (``tests.settings``) and the models from
+the test app, but don't need a database unless stated otherwise.
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.settings')
+
+    import django
+    django.setup()
+
+
+def per_call(fn, number, repeat=5):
+    """Best-of-`repeat` time of a single `fn()` call, in microseconds."""
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return best / number * 1e6
+
+
+def report(title, rows, unit='us'):
+    print(title)
+    width = max(len(name) for name, _ in rows)
+    for name, value in rows:
+        print('  {0:<{1}}  {2:10.2f} {3}'.format(name, width, value, unit))
+    print('')
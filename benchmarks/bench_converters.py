@@ -0,0 +1,51 @@
+"""
+Per-row cost of converting model field values for serialization.
+
+"force_text" converts every field with `force_text(strings_only=True)`, as
+all fields used to be; "converters" uses the per-field-class converters
+chosen when the plan is compiled. Uses the test app's `Book` model, which
+has foreign keys and a decimal field.
+"""
+from decimal import Decimal
+
+from . import per_call, report, setup_django
+
+ROWS = 10000
+
+
+def main():
+    setup_django()
+
+    from resticus import utils
+    from resticus.utils import get_spec
+    from tests.testapp.models import Book
+
+    books = [Book(id=i, author_id=i, publisher_id=1, title='Book %d' % i,
+        isbn='123-%d' % i, price=Decimal('10.00')) for i in range(ROWS)]
+    rows = [(b.id, b.author_id, b.publisher_id, b.title, b.isbn, b.price)
+        for b in books]
+    fields = ['id', 'author', 'publisher', 'title', 'isbn', 'price']
+
+    def plan(converters):
+        saved, utils._field_converters = utils._field_converters, converters
+        try:
+            return utils.SerializationPlan(Book, get_spec(fields=fields))
+        finally:
+            utils._field_converters = saved
+
+    results = []
+    for label, converters in (
+        ('force_text', {}),
+        ('converters', utils._field_converters),
+    ):
+        p = plan(converters)
+        results.append((label + ', instances',
+            per_call(lambda: p.serialize_many(books), 1) / ROWS))
+        results.append((label + ', values()',
+            per_call(lambda: p.serialize_values(rows), 1) / ROWS))
+
+    report('Book, %d fields (per row)' % len(fields), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Throughput, latency and conformance of the JSON encoder/decoder backends.
+
+Every backend in `resticus.encoders` whose library is importable is run on
+small, medium and large payloads shaped like API responses: lists of
+objects holding Decimals, datetimes, lazy translation strings and nested
+lists. Latency is the best time of one call, throughput is the encoded
+size over that time.
+
+The conformance section decodes each backend's output with the standard
+library and compares it with the output of the default `JSONEncoder`, and
+decodes the default encoder's output with each decoder; any difference is
+listed with the path to the value.
+"""
+import datetime
+from decimal import Decimal
+
+from . import per_call, report, setup_django
+
+SIZES = (('small', 1), ('medium', 100), ('large', 10000))
+
+
+def make_payload(rows):
+    from django.utils.translation import ugettext_lazy
+
+    created = datetime.datetime(2020, 1, 2, 3, 4, 5, 678901)
+    return {'data': [{
+        'id': i,
+        'title': u'Book \u00e9 %d' % i,
+        'price': Decimal('10.%02d' % (i % 100)),
+        'ratio': i / 7.0,
+        'created': created + datetime.timedelta(seconds=i),
+        'published': created.date(),
+        'status': ugettext_lazy('Available'),
+        'tags': ['a', 'b', [i, None, True]],
+        'author': {'id': i, 'name': 'Author %d' % i},
+    } for i in range(rows)]}
+
+
+def backends():
+    """The (encoder, decoder) class pairs whose library is importable."""
+    from resticus import encoders
+
+    pairs = [(encoders.JSONEncoder, encoders.JSONDecoder)]
+    if encoders.rapidjson is not None:
+        pairs.append((encoders.RapidJSONEncoder, encoders.RapidJSONDecoder))
+    if encoders.orjson is not None:
+        pairs.append((encoders.OrJSONEncoder, encoders.OrJSONDecoder))
+    return pairs
+
+
+def differences(a, b, path='$'):
+    """Yield the paths at which the decoded values `a` and `b` differ."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in sorted(set(a) | set(b)):
+            if key not in a or key not in b:
+                yield '{0}.{1}: missing'.format(path, key)
+            else:
+                for diff in differences(a[key], b[key], '%s.%s' % (path, key)):
+                    yield diff
+    elif isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+        for i, (x, y) in enumerate(zip(a, b)):
+            for diff in differences(x, y, '%s[%d]' % (path, i)):
+                yield diff
+    elif type(a) is not type(b) or a != b:
+        yield '{0}: {1!r} != {2!r}'.format(path, a, b)
+
+
+def main():
+    setup_django()
+
+    from resticus.encoders import JSONDecoder, JSONEncoder, encode_json
+
+    pairs = backends()
+    payloads = [(name, make_payload(rows)) for name, rows in SIZES]
+
+    for name, payload in payloads:
+        number = max(1, 1000 // len(payload['data']))
+        reference = encode_json(payload, JSONEncoder())
+        latency, throughput = [], []
+        for encoder_class, decoder_class in pairs:
+            encoder, decoder = encoder_class(), decoder_class()
+            encoded = encode_json(payload, encoder)
+            text = encoded.decode('utf-8')
+            label = encoder_class.__name__.replace('Encoder', '')
+            for op, fn in (
+                ('encode', lambda: encode_json(payload, encoder)),
+                ('decode', lambda: decoder.decode(text)),
+            ):
+                us = per_call(fn, number)
+                latency.append(('%s %s' % (label, op), us))
+                throughput.append(('%s %s' % (label, op), len(encoded) / us))
+        report('%s payload, %d bytes: latency' % (name, len(reference)),
+            latency)
+        report('%s payload: throughput' % name, throughput, unit='MB/s')
+
+    # Conformance, on the medium payload
+    payload = dict(payloads)['medium']
+    reference_text = encode_json(payload, JSONEncoder()).decode('utf-8')
+    expected = JSONDecoder().decode(reference_text)
+    print('Conformance with JSONEncoder/JSONDecoder')
+    if len(pairs) == 1:
+        print('  no other backend is installed')
+    for encoder_class, decoder_class in pairs[1:]:
+        for cls, decoded in (
+            (encoder_class, JSONDecoder().decode(
+                encode_json(payload, encoder_class()).decode('utf-8'))),
+            (decoder_class, decoder_class().decode(reference_text)),
+        ):
+            diffs = list(differences(expected, decoded))
+            print('  {0}: {1}'.format(cls.__name__,
+                '%d differences' % len(diffs) if diffs else 'identical'))
+            for diff in diffs[:5]:
+                print('    ' + diff)
+    print('')
+
+
+if __name__ == '__main__':
+    main()
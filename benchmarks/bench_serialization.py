@@ -0,0 +1,46 @@
+"""
+Per-row cost of serializing model instances.
+
+"uncached" compiles a fresh serialization plan for every row, which is the
+amount of work `serialize_model()` used to do per object; "cached" reuses
+the plan compiled for the spec, as `serialize()` does now.
+"""
+from decimal import Decimal
+
+from . import per_call, report, setup_django
+
+ROWS = 10000
+
+
+def main():
+    setup_django()
+
+    from resticus.utils import SerializationPlan, get_spec, serialize
+    from tests.testapp.models import Author, Book
+
+    authors = [Author(id=i, name='Author %d' % i) for i in range(ROWS)]
+    books = [Book(id=i, author_id=i, publisher_id=1, title='Book %d' % i,
+        isbn='123-%d' % i, price=Decimal('10.00')) for i in range(ROWS)]
+
+    for label, objs, fields in (
+        ('Author, all fields', authors, None),
+        ('Book, all fields', books, None),
+        ('Book, 3 fields', books, ['id', 'title', 'price']),
+    ):
+        spec = get_spec(fields=fields)
+
+        def uncached():
+            for obj in objs:
+                SerializationPlan(obj.__class__, spec)(obj)
+
+        def cached():
+            serialize(objs, fields=fields)
+
+        report(label + ' (per row)', [
+            ('uncached plan', per_call(uncached, 1) / ROWS),
+            ('cached plan', per_call(cached, 1) / ROWS),
+        ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+import base64
+import threading
+from io import BytesIO
+
+from django.contrib.auth.middleware import get_user
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections, connections
+from django.utils import six, translation
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import ugettext as _
+
+from . import exceptions, http
+from .encoders import RawJSON, encode_json
+from .mediatypes import match, parse_media_type
+from .views import Endpoint
+
+try:
+    from django.urls import Resolver404, get_urlconf, resolve, set_urlconf
+except ImportError:
+    from django.core.urlresolvers import (
+        Resolver404, get_urlconf, resolve, set_urlconf)
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+__all__ = ['BatchEndpoint']
+
+# Headers of the batch request passed on to the sub-requests
+_inherited_headers = ('HTTP_HOST', 'HTTP_COOKIE', 'HTTP_AUTHORIZATION',
+    'HTTP_USER_AGENT', 'HTTP_ACCEPT_LANGUAGE')
+
+# Headers sub-requests can't set; sub-responses are never compressed
+_ignored_headers = ('HTTP_ACCEPT_ENCODING',)
+
+_json = parse_media_type('application/json')
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    """A thread pool with `workers` threads, shared by batch endpoints."""
+    with _executors_lock:
+        try:
+            return _executors[workers]
+        except KeyError:
+            executor = _executors[workers] = ThreadPoolExecutor(workers)
+            return executor
+
+
+class BatchEndpoint(Endpoint):
+    """
+    An endpoint running many API calls in one HTTP request. The body is a
+    JSON array of sub-requests::
+
+        [{"method": "GET", "path": "/authors/?name=Foo"},
+         {"method": "POST", "path": "/authors/", "body": {"name": "Bar"},
+          "headers": {"Accept-Language": "de"}}]
+
+    Each is resolved with the URL resolver and dispatched to its
+    :py:class:`resticus.views.Endpoint` in-process, without going through
+    the middleware. Endpoints accepting the authentication method used
+    for the batch request reuse its user; others authenticate the
+    sub-request with their own `authentication_classes`. The response
+    lists the results, in order::
+
+        {"data": [{"status": 200, "headers": {...}, "body": {...}}, ...]}
+
+    Cookies set by a sub-response are listed in its ``Set-Cookie`` header
+    (a list of cookie strings), rather than set on the batch response.
+    JSON bodies are embedded as they are, and text bodies as strings;
+    other bodies (eg. MessagePack, or with a Content-Encoding) are base64
+    encoded.
+
+    Sub-requests are run one after another. If `workers` is set, runs of
+    consecutive read-only (GET, HEAD, OPTIONS) sub-requests are run
+    concurrently in a thread pool of that size instead, unless the batch
+    runs in a transaction (eg. with ATOMIC_REQUESTS): the threads use
+    database connections of their own, which wouldn't see its changes.
+    """
+
+    # Maximum number of sub-requests in a batch
+    max_requests = 50
+
+    # Size of the thread pool for read-only sub-requests, 0 to run them
+    # in the request's thread
+    workers = 0
+
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def post(self, request):
+        items = self.get_items(request)
+        subrequests = [self.make_request(request, item) for item in items]
+
+        concurrent = self.workers and ThreadPoolExecutor is not None and \
+            not any(conn.in_atomic_block for conn in connections.all())
+
+        results, i = [], 0
+        while i < len(subrequests):
+            j = i
+            if concurrent:
+                while j < len(subrequests) and \
+                        subrequests[j].method in self.safe_methods:
+                    j += 1
+            if j - i > 1:
+                executor = _get_executor(self.workers)
+                results.extend(executor.map(self._run_in_thread(),
+                    subrequests[i:j]))
+                i = j
+            else:
+                results.append(self.run(subrequests[i]))
+                i += 1
+
+        return http.Http200({'data': results})
+
+    def get_items(self, request):
+        items = request.data
+        if not isinstance(items, list) or not all(
+                isinstance(item, dict) and
+                isinstance(item.get('path'), six.string_types) and
+                item['path'].startswith('/') and
+                isinstance(item.get('method', 'GET'), six.string_types) and
+                isinstance(item.get('headers', {}), dict)
+                for item in items):
+            raise exceptions.ParseError(
+                _('Expected a list of requests with a method and a path.'))
+        if len(items) > self.max_requests:
+            raise exceptions.ParseError(
+                _('At most {0} requests can be batched.').format(
+                    self.max_requests))
+        return items
+
+    def make_request(self, request, item):
+        """Build the sub-request described by `item`."""
+        environ = dict((key, value) for key, value in request.META.items()
+            if not key.startswith('HTTP_') or key in _inherited_headers)
+
+        path, _sep, query = item['path'].partition('?')
+        script_name = environ.get('SCRIPT_NAME', '')
+        if script_name and path.startswith(script_name):
+            path = path[len(script_name):]
+
+        body = item.get('body')
+        if body is None:
+            body = b''
+        elif isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        elif not isinstance(body, bytes):
+            body = encode_json(body)
+            environ['CONTENT_TYPE'] = 'application/json'
+        if not body:
+            environ.pop('CONTENT_TYPE', None)
+
+        for name, value in item.get('headers', {}).items():
+            name = name.upper().replace('-', '_')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = 'HTTP_' + name
+            if name not in _ignored_headers:
+                environ[name] = str(value)
+
+        environ.update({
+            'REQUEST_METHOD': item.get('method', 'GET').upper(),
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        })
+
+        subrequest = WSGIRequest(environ)
+        subrequest.outer_auth = (request.user, request.authenticator)
+        if hasattr(request, 'session'):
+            subrequest.session = request.session
+            # As set by AuthenticationMiddleware, for SessionAuth
+            subrequest.user = SimpleLazyObject(lambda: get_user(subrequest))
+        subrequest.urlconf = getattr(request, 'urlconf', None)
+        return subrequest
+
+    def run(self, subrequest):
+        """Dispatch `subrequest` and return its result."""
+        try:
+            resolved = resolve(subrequest.path_info, subrequest.urlconf)
+        except Resolver404:
+            resolved = None
+        view_class = getattr(resolved and resolved.func, 'view_class', None)
+
+        if view_class is None or not issubclass(view_class, Endpoint):
+            response = http.Http404(_('Resource not found'))
+        elif issubclass(view_class, BatchEndpoint):
+            response = http.Http400(_('Batch requests can\'t be nested.'))
+        else:
+            response = resolved.func(subrequest, *resolved.args,
+                **resolved.kwargs)
+        result = self.get_result(response)
+        if subrequest.method == 'HEAD':
+            # Done by the server for regular requests
+            result['body'] = None
+        return result
+
+    def _run_in_thread(self):
+        language = translation.get_language()
+        urlconf = get_urlconf()
+
+        def run(subrequest):
+            # Pool threads outlive requests, so their database connections
+            # are managed as the request signals do in request threads
+            close_old_connections()
+            set_urlconf(urlconf)
+            try:
+                with translation.override(language):
+                    return self.run(subrequest)
+            finally:
+                set_urlconf(None)
+                close_old_connections()
+        return run
+
+    def get_result(self, response):
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+
+        media_type = parse_media_type(response.get('Content-Type', ''))
+        charset = media_type and media_type.params.get('charset')
+        if not content:
+            body = None
+        elif response.has_header('Content-Encoding'):
+            body = base64.b64encode(content).decode('ascii')
+        elif media_type is not None and match(media_type, _json) >= 2:
+            body = RawJSON(content)
+        elif charset or media_type is None or media_type.type == 'text':
+            body = content.decode(charset or 'utf-8', 'replace')
+        else:
+            body = base64.b64encode(content).decode('ascii')
+
+        headers = dict(response.items())
+        if response.cookies:
+            headers['Set-Cookie'] = [morsel.OutputString()
+                for morsel in response.cookies.values()]
+        return {
+            'status': response.status_code,
+            'headers': headers,
+            'body': body,
+        }
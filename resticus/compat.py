@@ -20,6 +20,27 @@ except ImportError:
     from django.utils import simplejson as json
 
 
+# Queryset iterable classes were introduced in Django 1.9
+try:
+    from django.db.models.query import ModelIterable
+except ImportError:
+    ModelIterable = None
+
+
+try:
+    from django.db.models import prefetch_related_objects
+except ImportError:
+    from django.db.models.query import prefetch_related_objects
+
+
+def queryset_iterator(queryset, chunk_size):
+    """`QuerySet.iterator()`, which only accepts `chunk_size` in Django 2.0+"""
+    try:
+        return queryset.iterator(chunk_size=chunk_size)
+    except TypeError:
+        return queryset.iterator()
+
+
 # Support custom user models in Django 1.5+
 try:
     from django.contrib.auth import get_user_model
@@ -1,33 +1,279 @@
+import datetime
+import re
+import threading
+import types
+import uuid
+
 from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import six
 from django.utils.encoding import force_text
 from django.utils.functional import Promise
 
 from .compat import json
+from .settings import api_settings
+
+try:
+    import rapidjson
+except ImportError:
+    rapidjson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = ['RawJSON', 'get_encoder', 'get_decoder', 'encode_json',
+    'decode_json']
+
+_local = threading.local()
+
+
+class RawJSON(object):
+    """
+    An already encoded JSON value, which the encoders write out verbatim,
+    eg. a cached representation spliced into a response::
+
+        JSONResponse({'data': RawJSON(cache.get(key))})
+
+    `data` is the JSON text, as UTF-8 encoded bytes or text. It isn't
+    validated.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        self.data = data
+
+    def __repr__(self):
+        return 'RawJSON(%r)' % self.data
+
+
+class _Fragments(object):
+    """
+    The RawJSON values met while encoding. Backends that can't write raw
+    JSON encode them as placeholder strings, which are replaced with the
+    fragments in the output.
+    """
+
+    def __init__(self):
+        self.token = None
+        self.data = []
+
+    def placeholder(self, raw):
+        if self.token is None:
+            self.token = uuid.uuid4().hex
+        self.data.append(raw.data)
+        return '%s:%d' % (self.token, len(self.data) - 1)
+
+    def splice(self, encoded):
+        if self.token is None:
+            return encoded
+        pattern = '"%s:(\\d+)"' % self.token
+        data = self.data
+        if not isinstance(encoded, bytes):
+            data = [fragment.decode('utf-8') for fragment in data]
+        else:
+            pattern = pattern.encode('ascii')
+        return re.sub(pattern, lambda m: data[int(m.group(1))], encoded)
+
+
+def _encode(encode, data):
+    """Call `encode(data)`, writing the RawJSON values in `data` verbatim."""
+    saved = getattr(_local, 'fragments', None)
+    _local.fragments = fragments = _Fragments()
+    try:
+        encoded = encode(data)
+    finally:
+        _local.fragments = saved
+    return fragments.splice(encoded)
+
+
+def _datetime(value):
+    # Same format as DjangoJSONEncoder, see ECMA-262 "Date Time String Format"
+    r = value.isoformat()
+    if value.microsecond:
+        r = r[:23] + r[26:]
+    if r.endswith('+00:00'):
+        r = r[:-6] + 'Z'
+    return r
 
 
 class JSONDecoder(json.JSONDecoder):
-    pass
+    """
+    The default decoder. Decoder classes implement ``decode(text)``, and
+    may implement ``decode_bytes(data)`` to decode UTF-8 encoded bytes,
+    bytearrays or memoryviews without decoding them to text first.
+    """
+
+    def decode_bytes(self, data):
+        # The stdlib parser only reads text
+        return self.decode(six.text_type(data, 'utf-8'))
 
 
 class JSONEncoder(DjangoJSONEncoder):
+    """
+    The default encoder. Encoder classes implement ``encode(data)``,
+    returning text, and may implement ``encode_bytes(data)`` to return
+    UTF-8 encoded bytes directly.
+
+    Instances are shared between threads (see :py:func:`get_encoder`), so
+    they must not keep per-call state.
+    """
+
     def default(self, obj):
+        # Exact types first, they are the most common values here
+        if obj.__class__ is datetime.datetime:
+            return _datetime(obj)
+        if obj.__class__ is datetime.date:
+            return obj.isoformat()
+        if isinstance(obj, RawJSON):
+            fragments = getattr(_local, 'fragments', None)
+            if fragments is None:
+                # Not called through encode(), so decode it the slow way
+                return json.loads(obj.data.decode('utf-8'))
+            return fragments.placeholder(obj)
         # Handle strings marked for translation
         if isinstance(obj, Promise):
             return force_text(obj)
+        # Lazily serialized sequences
+        if isinstance(obj, types.GeneratorType):
+            return list(obj)
         return super(JSONEncoder, self).default(obj)
 
+    def encode(self, data):
+        return _encode(super(JSONEncoder, self).encode, data)
+
+    def encode_bytes(self, data):
+        encode = super(JSONEncoder, self).encode
+        return _encode(lambda data: encode(data).encode('utf-8'), data)
+
+
+# Fallback for types the third-party backends don't handle natively; the
+# method doesn't use any instance state, so one encoder serves all threads.
+_default = JSONEncoder().default
+
 
 class RapidJSONDecoder(object):
     def decode(self, data):
-        import rapidjson
+        return rapidjson.loads(data, use_decimal=True)
+
+    def decode_bytes(self, data):
+        if isinstance(data, memoryview):
+            data = data.tobytes()
         return rapidjson.loads(data, use_decimal=True)
 
 
 class RapidJSONEncoder(object):
-    def __init__(self):
-        self._encoder = JSONEncoder()
+    item_separator = ','
+    key_separator = ':'
 
     def encode(self, data):
-        import rapidjson
-        return rapidjson.dumps(data, default=self._encoder.default,
+        return _encode(self._dumps, data)
+
+    def _dumps(self, data):
+        return rapidjson.dumps(data, default=_default,
             use_decimal=True, datetime_mode=True)
+
+    def encode_bytes(self, data):
+        return self.encode(data).encode('utf-8')
+
+
+class OrJSONDecoder(object):
+    def decode(self, data):
+        return orjson.loads(data)
+
+    # orjson reads bytes, bytearrays and memoryviews in place
+    decode_bytes = decode
+
+
+class OrJSONEncoder(object):
+    """
+    An encoder backed by orjson, which produces bytes natively.
+
+    Dates and times are passed through to the default encoder, and Decimals
+    aren't supported by orjson, so both are formatted as with the default
+    :py:class:`JSONEncoder`.
+    """
+    item_separator = ','
+    key_separator = ':'
+
+    def __init__(self):
+        self.option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def encode(self, data):
+        return self.encode_bytes(data).decode('utf-8')
+
+    def encode_bytes(self, data):
+        if _Fragment is not None:
+            return orjson.dumps(data, default=_orjson_default,
+                option=self.option)
+        return _encode(self._dumps, data)
+
+    def _dumps(self, data):
+        return orjson.dumps(data, default=_default, option=self.option)
+
+
+# orjson 3.9+ writes fragments natively
+_Fragment = getattr(orjson, 'Fragment', None)
+
+
+def _orjson_default(obj):
+    if isinstance(obj, RawJSON):
+        return _Fragment(obj.data)
+    return _default(obj)
+
+
+_encoders = {}
+_decoders = {}
+
+
+def get_encoder(cls=None):
+    """
+    Return the shared instance of the encoder class `cls`, which defaults
+    to the ``JSON_ENCODER`` setting.
+    """
+    cls = cls or api_settings.JSON_ENCODER
+    try:
+        return _encoders[cls]
+    except KeyError:
+        return _encoders.setdefault(cls, cls())
+
+
+def get_decoder(cls=None):
+    """
+    Return the shared instance of the decoder class `cls`, which defaults
+    to the ``JSON_DECODER`` setting.
+    """
+    cls = cls or api_settings.JSON_DECODER
+    try:
+        return _decoders[cls]
+    except KeyError:
+        return _decoders.setdefault(cls, cls())
+
+
+def encode_json(data, encoder=None):
+    """Encode `data` to UTF-8 encoded JSON with the shared encoder."""
+    encoder = encoder or get_encoder()
+    try:
+        encode = encoder.encode_bytes
+    except AttributeError:
+        return encoder.encode(data).encode('utf-8')
+    return encode(data)
+
+
+def decode_json(data, decoder=None):
+    """
+    Decode `data` with the shared decoder. `data` is either JSON text or
+    UTF-8 encoded bytes, bytearray or memoryview, which are passed to the
+    decoder as they are if it supports that.
+    """
+    decoder = decoder or get_decoder()
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        try:
+            decode = decoder.decode_bytes
+        except AttributeError:
+            data = six.text_type(data, 'utf-8')
+        else:
+            return decode(data)
+    return decoder.decode(data)
@@ -1,26 +1,57 @@
+import sys
+
+from django.conf import settings
 from django.utils.translation import ugettext as _
 
 from . import http
 
 
 class APIException(Exception):
-    """Exception that results in returning a JSONErrorResponse to the user."""
+    """
+    Exception that results in returning a JSONErrorResponse to the user.
+
+    The response is only built when `response` is first accessed, so
+    exceptions that are caught and handled don't pay for it. Under DEBUG,
+    it reports the traceback of the exception being handled when the
+    exception was created, if any, like responses built right away.
+    """
 
     response_class = http.JSONErrorResponse
     default_reason = None
+    status_code = None
 
     def __init__(self, reason=None, **additional_data):
         super(APIException, self).__init__()
-        reason = reason or self.default_reason
-        self.response = self.response_class(reason, **additional_data)
+        self.reason = reason or self.default_reason
+        self.additional_data = additional_data
+        # Formatted only if the response is built
+        self._exc_info = sys.exc_info() if settings.DEBUG else (None,) * 3
+
+    @property
+    def response(self):
+        try:
+            return self._response
+        except AttributeError:
+            pass
+        with http._reported_exception(self._exc_info):
+            response = self.response_class(self.reason,
+                **self.additional_data)
+        if self.status_code is not None:
+            response.status_code = self.status_code
+        self._response = response
+        return response
+
+    @response.setter
+    def response(self, response):
+        self._response = response
 
 
 class HttpError(APIException):
     def __init__(self, code=None, reason=None, **additional_data):
-        code = code or self.status_code
         reason = reason or _('Internal server error')
         super(HttpError, self).__init__(reason, **additional_data)
-        self.response.status_code = code
+        if code:
+            self.status_code = code
 
 
 class AuthenticationFailed(APIException):
@@ -41,11 +72,21 @@ class Forbidden(APIException):
     response_class = http.Http403
 
 
+class NotAcceptable(APIException):
+    response_class = http.Http406
+    default_reason = _('Could not satisfy the request\'s Accept header.')
+
+
 class ParseError(APIException):
     response_class = http.Http400
     default_reason = _('Malformed request.')
 
 
+class RequestEntityTooLarge(APIException):
+    response_class = http.Http413
+    default_reason = _('Request body too large.')
+
+
 class PermissionDenied(APIException):
     response_class = http.Http403
     default_reason = _('You do not have permission to perform this action.')
@@ -59,4 +100,4 @@ class ValidationError(APIException):
         # rapidjson doesn't properly serialize collection.User[List|Dict], which
         # is used for Django's Error[List|Dict], so we have to manually convert.
         kwargs.setdefault('details', {k: list(v) for k, v in form.errors.items()})
-        super(ValidationError, self).__init__(self, **kwargs)
+        super(ValidationError, self).__init__(**kwargs)
@@ -1,11 +1,13 @@
 from django.core.exceptions import ImproperlyConfigured
 from django.forms.models import modelform_factory
+from django.utils import six
 from django.utils.translation import ugettext as _
 
 from django_filters.filterset import filterset_factory
 
 from . import exceptions, http, mixins
-from .utils import serialize
+from .utils import (get_columns, iter_chunks, narrow_fields,
+    optimize_queryset, parse_field_selection, serialize, serialize_chunks)
 from .views import Endpoint
 
 __all__ = ['GenericEndpoint', 'CreateEndpoint', 'ListEndpoint',
@@ -24,6 +26,18 @@ class GenericEndpoint(Endpoint):
     form_class = None
     queryset = None
 
+    # Name of a datetime field holding the modification time of objects,
+    # used for Last-Modified / If-Modified-Since handling
+    last_modified_field = None
+
+    # Query parameter clients can use to select a subset of `fields`
+    fields_param = 'fields'
+
+    streaming = False
+    chunk_size = 1000
+    identity_map = False
+    columnar = False
+
     def get_queryset(self):
         if self.queryset is not None:
             return self.queryset._clone()
@@ -35,18 +49,58 @@ class GenericEndpoint(Endpoint):
             'override "get_queryset()"')
         raise ImproperlyConfigured(msg.format(self.__class__.__name__))
 
-    def get_object(self):
-        queryset = self.get_queryset()
-
+    def get_fields(self):
+        """
+        Return the attribute descriptions to serialize: `fields`, narrowed
+        down to the selection in the `fields_param` query parameter (eg.
+        ``?fields=id,title,author(name)``), if any.
+        """
+        try:
+            return self._selected_fields
+        except AttributeError:
+            pass
+
+        fields = self.fields
+        value = self.request.GET.get(self.fields_param) if self.fields_param else None
+        if value:
+            try:
+                selection = parse_field_selection(value)
+            except ValueError:
+                msg = _('Malformed "{0}" parameter.')
+                raise exceptions.ParseError(msg.format(self.fields_param))
+            model = self.model or self.get_queryset().model
+            fields = narrow_fields(model, selection, fields)
+
+        self._selected_fields = fields
+        return fields
+
+    def optimize_queryset(self, queryset):
+        """
+        Prepare `queryset` for serialization by selecting or prefetching
+        the related objects named in the fields. When the client selected
+        a subset of the fields, the columns that aren't serialized are
+        deferred too, unless :py:meth:`serialize` is overridden and may
+        read any of them.
+        """
+        selected = self.fields_param and self.request.GET.get(self.fields_param)
+        return optimize_queryset(queryset, fields=self.get_fields(),
+            only=bool(selected) and not self._serializes_per_object())
+
+    def get_lookup(self):
         lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
         try:
-            lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            return {self.lookup_field: self.kwargs[lookup_url_kwarg]}
         except KeyError:
             msg = _('Lookup field "{0}" was not provided in view '
                 'kwargs to "{1}"')
             raise ImproperlyConfigured(msg.format(lookup_url_kwarg,
                 self.__class__.__name__))
 
+    def get_object(self, queryset=None):
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        lookup = self.get_lookup()
         try:
             obj = queryset.get(**lookup)
         except self.model.DoesNotExist:
@@ -60,9 +114,11 @@ class GenericEndpoint(Endpoint):
             return self.filter_class
         return filterset_factory(self.model)
 
-    def get_filter(self):
+    def get_filter(self, queryset=None):
+        if queryset is None:
+            queryset = self.get_queryset()
         FilterClass = self.get_filter_class()
-        return FilterClass(self.request.GET, queryset=self.get_queryset())
+        return FilterClass(self.request.GET, queryset=queryset)
 
     def get_form_class(self):
         if self.form_class is not None:
@@ -80,8 +136,39 @@ class GenericEndpoint(Endpoint):
     def form_invalid(self, form):
         raise exceptions.ValidationError(form=form)
 
-    def serialize(self, objs):
-        return serialize(objs, fields=self.fields)
+    def serialize(self, obj):
+        """Serialize a single object. Can be overridden to customize it."""
+        return serialize(obj, fields=self.get_fields(),
+            identity_map=self.identity_map)
+
+    def serialize_list(self, objs, columnar=False):
+        """
+        Serialize a list or queryset of objects. If :py:meth:`serialize` is
+        overridden, it is called for every object; otherwise the whole list
+        is serialized at once, from column values when possible.
+        """
+        if self._serializes_per_object():
+            data = [self.serialize(obj) for obj in objs]
+            return serialize(data, columnar=True) if columnar else data
+        return serialize(objs, fields=self.get_fields(),
+            identity_map=self.identity_map, columnar=columnar)
+
+    def serialize_chunks(self, objs, columnar=False):
+        if self._serializes_per_object():
+            return ([self.serialize(obj) for obj in chunk]
+                for chunk in iter_chunks(objs, self.chunk_size))
+        return serialize_chunks(objs, self.chunk_size,
+            fields=self.get_fields(), identity_map=self.identity_map,
+            columnar=columnar)
+
+    def get_columns(self, queryset):
+        if self._serializes_per_object():
+            return None
+        return get_columns(queryset.model, fields=self.get_fields())
+
+    def _serializes_per_object(self):
+        return six.get_unbound_function(self.__class__.serialize) is not \
+            six.get_unbound_function(GenericEndpoint.serialize)
 
 
 class CreateEndpoint(
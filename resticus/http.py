@@ -1,42 +1,480 @@
+import contextlib
+import re
 import sys
+import threading
 import traceback
+import zlib
+from collections import OrderedDict
+
+try:
+    from collections.abc import Iterator
+except ImportError:
+    from collections import Iterator
 
 from django import http
 from django.conf import settings
-from django.utils.translation import ugettext as _
-
+from django.utils import six
+from django.test.signals import setting_changed
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import force_text
+from django.utils.functional import Promise
+from django.utils.translation import get_language, ugettext as _
+
+from .encoders import RawJSON, _default, encode_json, get_encoder
 from .settings import api_settings
 
-__all__ = ['JSONResponse', 'JSONErrorResponse', 'Http200', 'Http201',
-    'Http204', 'Http400', 'Http401', 'Http403', 'Http404', 'Http405',
-    'Http409', 'Http500']
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ['JSONResponse', 'StreamingJSONResponse', 'StreamingJSONListResponse',
+    'JSONErrorResponse',
+    'compress_response', 'error_body', 'Http200', 'Http201',
+    'Http204', 'Http304', 'Http400', 'Http401', 'Http403', 'Http404', 'Http405',
+    'Http406', 'Http409', 'Http413', 'Http500']
 
 HTTP_HEADER_ENCODING = 'iso-8859-1'
 
 
 class JSONResponse(http.HttpResponse):
-    """An HTTP response class that consumes data to be serialized to JSON."""
+    """
+    An HTTP response class that consumes data to be serialized to JSON, or
+    another format if a `renderer` (see :py:mod:`resticus.renderers`) is
+    given.
+    """
+
+    def __init__(self, data, renderer=None, **kwargs):
+        if renderer is None:
+            kwargs.setdefault('content_type', 'application/json')
+            if isinstance(data, RawJSON):
+                data = data.data
+            else:
+                data = encode_json(data)
+        else:
+            kwargs.setdefault('content_type', renderer.media_type)
+            data = renderer.render(data)
+        super(JSONResponse, self).__init__(content=data, **kwargs)
+
+
+_leaf_types = six.string_types + six.integer_types + (float, bool,
+    type(None), RawJSON)
+_container_types = (dict, list, tuple, Iterator)
+
+
+class StreamingJSONResponse(http.StreamingHttpResponse):
+    """
+    A streaming response encoding any JSON-serializable `data`
+    incrementally, so the whole body is never held in memory.
+
+    Dicts, lists, tuples, and generators or other iterators anywhere in
+    `data` are walked and written piece by piece; iterators are consumed
+    lazily as the response is sent. Runs of plain values are encoded in
+    batches of up to `batch_size` items with the encoder (`encoder`, by
+    default the shared ``JSON_ENCODER`` instance). Other types are
+    converted with the encoder's `default` method first, so it can also
+    return iterators to be streamed.
+
+    The output is sent in chunks of about `chunk_size` bytes.
+    """
 
-    def __init__(self, data, **kwargs):
+    chunk_size = 64 * 1024
+    batch_size = 1000
+
+    def __init__(self, data, chunk_size=None, encoder=None, **kwargs):
         kwargs.setdefault('content_type', 'application/json')
-        data = api_settings.JSON_ENCODER().encode(data).encode('utf-8')
-        super(JSONResponse, self).__init__(content=data, **kwargs)
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        self.encoder = encoder or get_encoder()
+        super(StreamingJSONResponse, self).__init__(
+            self.stream(data), **kwargs)
+
+    def stream(self, data):
+        buf, size = [], 0
+        for piece in self.iterencode(data):
+            buf.append(piece)
+            size += len(piece)
+            if size >= self.chunk_size:
+                yield b''.join(buf)
+                buf, size = [], 0
+        if buf:
+            yield b''.join(buf)
+
+    def iterencode(self, data):
+        """Yield the encoded `data` in pieces."""
+        self._default = getattr(self.encoder, 'default', _default)
+        self._separator = getattr(self.encoder, 'item_separator', ',') \
+            .encode('utf-8')
+        return self._iterencode(self._convert(data))
+
+    def _convert(self, value):
+        if isinstance(value, _leaf_types + _container_types):
+            return value
+        return self._default(value)
+
+    def _iterencode(self, value):
+        if isinstance(value, dict):
+            return self._iterencode_dict(value)
+        if isinstance(value, _container_types):
+            return self._iterencode_list(value)
+        return iter([encode_json(value, self.encoder)])
+
+    def _iterencode_list(self, items):
+        separator = self._separator
+        yield b'['
+        first, batch = True, []
+        for item in items:
+            item = self._convert(item)
+            if not isinstance(item, _container_types):
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+                pieces, batch = [encode_json(batch, self.encoder)[1:-1]], []
+            else:
+                if batch:
+                    if not first:
+                        yield separator
+                    first = False
+                    yield encode_json(batch, self.encoder)[1:-1]
+                    batch = []
+                pieces = self._iterencode(item)
+            if not first:
+                yield separator
+            first = False
+            for piece in pieces:
+                yield piece
+        if batch:
+            if not first:
+                yield separator
+            yield encode_json(batch, self.encoder)[1:-1]
+        yield b']'
+
+    def _iterencode_dict(self, obj):
+        separator = self._separator
+        yield b'{'
+        first, batch = True, {}
+        for key, value in six.iteritems(obj):
+            value = self._convert(value)
+            if not isinstance(value, _container_types):
+                batch[key] = value
+                if len(batch) < self.batch_size:
+                    continue
+                pieces, batch = [encode_json(batch, self.encoder)[1:-1]], {}
+            else:
+                if batch:
+                    if not first:
+                        yield separator
+                    first = False
+                    yield encode_json(batch, self.encoder)[1:-1]
+                    batch = {}
+                # The key and separator, as the encoder writes them
+                pieces = self._prefix(encode_json({key: 0}, self.encoder)[1:-2],
+                    self._iterencode(value))
+            if not first:
+                yield separator
+            first = False
+            for piece in pieces:
+                yield piece
+        if batch:
+            if not first:
+                yield separator
+            yield encode_json(batch, self.encoder)[1:-1]
+        yield b'}'
+
+    @staticmethod
+    def _prefix(prefix, pieces):
+        yield prefix
+        for piece in pieces:
+            yield piece
+
+
+class StreamingJSONListResponse(http.StreamingHttpResponse):
+    """
+    A streaming response for large lists, written as ``{"<key>": [...]}``.
+
+    `chunks` is an iterable of lists (eg. from
+    :py:func:`resticus.utils.serialize_chunks`); each list is encoded and
+    sent as soon as it is produced, so the whole payload is never held in
+    memory.
+
+    If `columns` is given, the chunks contain rows of values, and the
+    response is written in the columnar shape,
+    ``{"<key>": {"columns": [...], "rows": [...]}}``.
+    """
+
+    def __init__(self, chunks, key='data', columns=None, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super(StreamingJSONListResponse, self).__init__(
+            self.stream(chunks, key, columns), **kwargs)
+
+    def stream(self, chunks, key, columns):
+        encoder = get_encoder()
+        separator = getattr(encoder, 'item_separator', ',').encode('utf-8')
+        colon = getattr(encoder, 'key_separator', ':').encode('utf-8')
+
+        if columns is None:
+            yield encode_json({key: []}, encoder)[:-2]
+            end = b']}'
+        else:
+            yield b''.join([b'{', encode_json(key, encoder), colon,
+                b'{"columns"', colon, encode_json(columns, encoder),
+                separator, b'"rows"', colon, b'['])
+            end = b']}}'
+        first = True
+        for chunk in chunks:
+            if not chunk:
+                continue
+            if not first:
+                yield separator
+            first = False
+            yield encode_json(chunk, encoder)[1:-1]
+        yield end
+
+
+class GzipCompressor(object):
+    encoding = 'gzip'
+    default_level = 6
+
+    def __init__(self, level=None):
+        if level is None:
+            level = self.default_level
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class BrotliCompressor(object):
+    encoding = 'br'
+    default_level = 5
+
+    def __init__(self, level=None):
+        if level is None:
+            level = self.default_level
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.finish()
+
+
+class ZstdCompressor(object):
+    encoding = 'zstd'
+    default_level = 3
+
+    def __init__(self, level=None):
+        if level is None:
+            level = self.default_level
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+# Supported content codings, in order of preference
+compressors = OrderedDict(
+    (cls.encoding, cls) for cls, available in (
+        (BrotliCompressor, brotli is not None),
+        (ZstdCompressor, zstandard is not None),
+        (GzipCompressor, True),
+    ) if available)
+
+_incompressible_types = ('image/', 'audio/', 'video/', 'font/',
+    'application/zip', 'application/gzip', 'application/octet-stream')
+
+
+def parse_accept_encoding(value):
+    """Parse an Accept-Encoding header into a dict of codings to q-values."""
+    codings = {}
+    for item in value.split(','):
+        coding, _sep, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        match = re.search(r'q\s*=\s*([^\s;]*)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def get_compressor(request):
+    """
+    Return the preferred compressor class acceptable to the client making
+    `request`, or None.
+    """
+    value = request.META.get('HTTP_ACCEPT_ENCODING')
+    if not value:
+        return None
+    codings = parse_accept_encoding(value)
+    best, best_q = None, 0
+    for encoding, cls in compressors.items():
+        q = codings.get(encoding, codings.get('*', 0))
+        if q > best_q:
+            best, best_q = cls, q
+    return best
+
+
+def _compression_level(encoding):
+    level = api_settings.COMPRESSION_LEVEL
+    if isinstance(level, dict):
+        return level.get(encoding)
+    return level
+
+
+def _compress_stream(compressor, chunks):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def compress_response(request, response):
+    """
+    Compress the body of `response` with the best content coding accepted
+    by the client, as listed in the `compressors`: brotli and zstd, if the
+    libraries are installed, and gzip.
+
+    Regular responses smaller than the ``COMPRESSION_MIN_SIZE`` setting
+    aren't compressed. Streaming responses are compressed chunk by chunk as
+    they're sent. The ``COMPRESSION_LEVEL`` setting is either a level used
+    for all codings, or a dict mapping codings to levels; by default each
+    coding's `default_level` is used.
+    """
+    if response.status_code == 304:
+        # Must carry the headers the full response would have
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+    if response.has_header('Content-Encoding') or \
+            response.status_code == 204 or response.status_code < 200:
+        return response
+    content_type = response.get('Content-Type', '')
+    if content_type.startswith(_incompressible_types):
+        return response
+
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if not response.streaming and \
+            len(response.content) < api_settings.COMPRESSION_MIN_SIZE:
+        return response
+
+    cls = get_compressor(request)
+    if cls is None:
+        return response
+    compressor = cls(_compression_level(cls.encoding))
+
+    if response.streaming:
+        response.streaming_content = _compress_stream(compressor,
+            response.streaming_content)
+        if response.has_header('Content-Length'):
+            del response['Content-Length']
+    else:
+        content = response.content
+        compressed = compressor.compress(content) + compressor.flush()
+        if len(compressed) >= len(content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+
+    # The compressed representation isn't byte-for-byte the same
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = cls.encoding
+    return response
+
+
+# Encoded bodies of error responses with fixed reasons
+_error_cache = {}
+_ERROR_CACHE_SIZE = 256
+
+
+def _clear_error_cache(*args, **kwargs):
+    if kwargs['setting'] in ('RESTICUS', 'DEBUG', 'LANGUAGE_CODE'):
+        _error_cache.clear()
+
+
+setting_changed.connect(_clear_error_cache)
+
+
+def error_body(cls, reason):
+    """
+    Return the body of a `cls` error response for `reason`, encoded once
+    per response class, reason and active language and then reused.
+    """
+    try:
+        key = (cls, force_text(reason) if isinstance(reason, Promise)
+            else reason, get_language())
+        return _error_cache[key]
+    except TypeError:
+        return {'errors': [{'detail': reason}]}
+    except KeyError:
+        if len(_error_cache) >= _ERROR_CACHE_SIZE:
+            _error_cache.clear()
+        body = _error_cache[key] = RawJSON(
+            encode_json({'errors': [{'detail': reason}]}))
+        return body
+
+
+# Per-thread exc_info overriding the one of the exception being handled
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def _reported_exception(exc_info):
+    """
+    Report the exception `exc_info` (a `sys.exc_info()` tuple) in the
+    error responses built in the block, rather than the one being handled.
+    """
+    previous = getattr(_local, 'exc_info', None)
+    _local.exc_info = exc_info
+    try:
+        yield
+    finally:
+        _local.exc_info = previous
+
+
+def _debug_traceback():
+    """The traceback of the exception being handled, under DEBUG."""
+    if settings.DEBUG:
+        exc = getattr(_local, 'exc_info', None) or sys.exc_info()
+        if exc[0] is not None:
+            return ''.join(traceback.format_exception(*exc))
+    return None
 
 
 class JSONErrorResponse(http.HttpResponseServerError, JSONResponse):
-    """A JSON response class for simple API errors."""
+    """
+    A JSON response class for simple API errors. Bodies without a
+    traceback are cached, see :py:func:`error_body`.
+    """
 
     default_reason = None
 
     def __init__(self, reason=None, **kwargs):
-        data = {'errors': [{'detail': reason or self.default_reason}]}
-
-        if settings.DEBUG:
-            exc = sys.exc_info()
-            if exc[0] is not None:
-                data['errors'][0]['meta'] = {
-                    'traceback': ''.join(traceback.format_exception(*exc))
-                }
+        reason = reason or self.default_reason
+        tb = _debug_traceback()
+        if tb is None:
+            data = error_body(self.__class__, reason)
+        else:
+            data = {'errors': [{'detail': reason, 'meta': {'traceback': tb}}]}
         super(JSONErrorResponse, self).__init__(data, **kwargs)
 
 
@@ -55,13 +493,23 @@ class Http204(http.HttpResponse):
     status_code = 204
 
 
+class Http304(http.HttpResponseNotModified):
+    """HTTP 304 Not Modified"""
+
+    def __init__(self, etag=None, **kwargs):
+        super(Http304, self).__init__(**kwargs)
+        if etag is not None:
+            self['ETag'] = etag
+
+
 class Http400(http.HttpResponseBadRequest, JSONResponse):
     """HTTP 400 Bad Request"""
 
     def __init__(self, reason, details=None, **kwargs):
-        data = {'errors': [{'detail': reason}]}
-        if details is not None:
-            data['errors'][0]['meta'] = {'details': details}
+        if details is None:
+            data = error_body(self.__class__, reason)
+        else:
+            data = {'errors': [{'detail': reason, 'meta': {'details': details}}]}
         super(Http400, self).__init__(data, **kwargs)
 
 
@@ -84,17 +532,28 @@ class Http405(http.HttpResponseNotAllowed, JSONResponse):
     """HTTP 405 Method Not Allowed"""
 
     def __init__(self, method, permitted_methods, *args, **kwargs):
+        # Not cached, the reason has the method sent by the client
         data = {'errors': [{
             'detail': _('Method "{0}" not allowed').format(method),
         }]}
         super(Http405, self).__init__(permitted_methods, data=data, *args, **kwargs)
 
 
+class Http406(JSONErrorResponse):
+    """HTTP 406 Not Acceptable"""
+    status_code = 406
+
+
 class Http409(JSONErrorResponse):
     """HTTP 409 Conflict"""
     status_code = 409
 
 
+class Http413(JSONErrorResponse):
+    """HTTP 413 Payload Too Large"""
+    status_code = 413
+
+
 class Http500(JSONErrorResponse):
     """HTTP 500 Internal Server Error"""
     pass
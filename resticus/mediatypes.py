@@ -0,0 +1,192 @@
+"""
+Parsing and matching of media types, as in the Content-Type and Accept
+headers. Parsed headers are cached, since clients tend to send the same
+few values over and over.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+__all__ = ['MediaType', 'parse_media_type', 'parse_accept', 'match',
+    'lookup']
+
+_CACHE_SIZE = 256
+
+_token = r"[!#$%&'*+.^_`|~0-9A-Za-z-]+"
+_media_type_re = re.compile(r'\s*(%s)/(%s)\s*' % (_token, _token))
+_param_re = re.compile(r'\s*;\s*(%s)\s*=\s*("(?:[^"\\]|\\.)*"|[^;,\s]*)\s*'
+    % _token)
+_quoted_pair_re = re.compile(r'\\(.)')
+
+
+class _LRUCache(object):
+    """A small thread-safe least recently used cache."""
+
+    def __init__(self, size):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data.pop(key)
+            except KeyError:
+                return default
+            self.data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data.pop(key, None)
+            self.data[key] = value
+            if len(self.data) > self.size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+_media_types = _LRUCache(_CACHE_SIZE)
+_accepts = _LRUCache(_CACHE_SIZE)
+
+
+class MediaType(object):
+    """
+    A parsed media type (or media range, with wildcards). Type, subtype,
+    parameter names and the charset are lowercased; `suffix` is the
+    structured syntax suffix of the subtype, eg. "json" for
+    ``application/vnd.api+json``. Instances are shared, so `params` must
+    not be modified.
+    """
+    __slots__ = ('type', 'subtype', 'suffix', 'params', 'q')
+
+    def __init__(self, type, subtype, params=None, q=1.0):
+        self.type = type
+        self.subtype = subtype
+        self.suffix = subtype.rpartition('+')[2] if '+' in subtype else None
+        self.params = params or {}
+        self.q = q
+
+    @property
+    def media_type(self):
+        return '%s/%s' % (self.type, self.subtype)
+
+    def __eq__(self, other):
+        return isinstance(other, MediaType) and \
+            (self.type, self.subtype, self.params, self.q) == \
+            (other.type, other.subtype, other.params, other.q)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'MediaType(%r, %r)' % (self.media_type, self.params)
+
+
+def _parse(value, pos=0):
+    """Parse a media type at `pos` in `value`; return it and the end."""
+    match = _media_type_re.match(value, pos)
+    if match is None:
+        return None, pos
+    type, subtype = match.group(1).lower(), match.group(2).lower()
+    params, q, pos = {}, 1.0, match.end()
+    while True:
+        match = _param_re.match(value, pos)
+        if match is None:
+            break
+        name, param = match.group(1).lower(), match.group(2)
+        pos = match.end()
+        if param.startswith('"'):
+            param = _quoted_pair_re.sub(r'\1', param[1:-1])
+        if name == 'q':
+            try:
+                q = float(param)
+            except ValueError:
+                q = 0.0
+        else:
+            if name == 'charset':
+                param = param.lower()
+            params[name] = param
+    return MediaType(type, subtype, params, q), pos
+
+
+def parse_media_type(value):
+    """
+    Parse a Content-Type header value. Returns None if it isn't a valid
+    media type.
+    """
+    media_type = _media_types.get(value, False)
+    if media_type is False:
+        media_type, pos = _parse(value)
+        if media_type is not None and value[pos:].strip(' ;'):
+            media_type = None
+        _media_types.set(value, media_type)
+    return media_type
+
+
+def parse_accept(value):
+    """
+    Parse an Accept header value into a tuple of media ranges, in the
+    order of the header. Invalid entries are skipped.
+    """
+    ranges = _accepts.get(value)
+    if ranges is None:
+        ranges, pos = [], 0
+        while pos < len(value):
+            media_range, pos = _parse(value, pos)
+            if media_range is not None and media_range.type == '*' and \
+                    media_range.subtype != '*':
+                media_range = None
+            if media_range is not None:
+                ranges.append(media_range)
+            # Skip to the next entry
+            comma = value.find(',', pos)
+            if comma < 0:
+                break
+            pos = comma + 1
+        ranges = tuple(ranges)
+        _accepts.set(value, ranges)
+    return ranges
+
+
+def match(media_range, media_type):
+    """
+    Return how specifically `media_range` matches `media_type`, or -1 if
+    it doesn't: 3 for the same type, 2 if one is the structured syntax
+    suffix of the other (``application/json`` and
+    ``application/vnd.api+json``), 1 for a subtype wildcard and 0 for
+    ``*/*``.
+    """
+    if media_range.type == '*':
+        return 0
+    if media_range.type != media_type.type:
+        return -1
+    if media_range.subtype == media_type.subtype:
+        return 3
+    if media_range.subtype == '*':
+        return 1
+    if media_type.suffix == media_range.subtype or \
+            media_range.suffix == media_type.subtype:
+        return 2
+    return -1
+
+
+def lookup(media_type, mapping):
+    """
+    Look up the value for `media_type` in `mapping`, keyed by media types
+    or ranges: the exact type, then the type named by its suffix (eg.
+    ``application/json`` for ``application/vnd.api+json``), then
+    ``type/*`` and ``*/*``. Returns None if there's no match.
+    """
+    candidates = [media_type.media_type]
+    if media_type.suffix:
+        candidates.append('%s/%s' % (media_type.type, media_type.suffix))
+    candidates.extend(['%s/*' % media_type.type, '*/*'])
+    for candidate in candidates:
+        try:
+            return mapping[candidate]
+        except KeyError:
+            pass
+    return None
@@ -1,4 +1,10 @@
-from . import http
+from django.db.models import Max
+from django.utils import six
+from django.utils.translation import ugettext as _
+
+from . import exceptions, http
+from .mediatypes import parse_accept
+from .permissions import BasePermission
 from .utils import patch_form
 
 __all__ = ['ListModelMixin', 'DetailModelMixin', 'CreateModelMixin',
@@ -6,16 +12,105 @@ __all__ = ['ListModelMixin', 'DetailModelMixin', 'CreateModelMixin',
 
 
 class ListModelMixin(object):
+    # Query parameter (and Accept header media type parameter) selecting
+    # the shape of the list, either "objects" or "columnar"
+    shape_param = 'shape'
+
     def get(self, request, *args, **kwargs):
-        filter = self.get_filter()
-        return {'data': [self.serialize(obj) for obj in filter]}
+        filter = self.get_filter(self.optimize_queryset(self.get_queryset()))
+        shape = self.get_shape(request)
+        columnar = self.columnar if shape is None else shape == 'columnar'
+        if self.streaming:
+            # Streamed rows need the columns up front; without them, fall
+            # back to objects unless the client asked for columns
+            columns = self.get_columns(filter.qs) if columnar else None
+            if columns is None and shape == 'columnar':
+                raise exceptions.NotAcceptable(
+                    _('This list can\'t be streamed in the columnar shape.'))
+            return http.StreamingJSONListResponse(
+                self.serialize_chunks(filter.qs, columnar=columns is not None),
+                columns=columns)
+        return {'data': self.serialize_list(filter.qs, columnar=columnar)}
+
+    def get_last_modified(self, request, *args, **kwargs):
+        """
+        The latest `last_modified_field` value in the filtered list. Note
+        that deleting objects doesn't change it.
+        """
+        if not self.last_modified_field:
+            return None
+        queryset = self.get_filter(self.get_queryset()).qs
+        return queryset.aggregate(
+            last_modified=Max(self.last_modified_field))['last_modified']
+
+    def is_columnar(self, request):
+        """
+        Whether the list should be in the columnar shape,
+        ``{"columns": [...], "rows": [[...], ...]}``, rather than a list
+        of objects; `columnar` is the default.
+        """
+        shape = self.get_shape(request)
+        if shape is None:
+            return self.columnar
+        return shape == 'columnar'
+
+    def get_vary_headers(self, request):
+        vary = super(ListModelMixin, self).get_vary_headers(request)
+        if self.shape_param not in request.params and 'Accept' not in vary:
+            # The shape can be picked with the Accept header
+            vary.append('Accept')
+        return vary
+
+    def get_shape(self, request):
+        """
+        The shape the client asked for, "objects" or "columnar", or None.
+        Clients can ask for either shape with the `shape` query parameter,
+        or an Accept header like ``application/json; shape=columnar``.
+        Other shapes are rejected with a 400 response.
+        """
+        shape = request.params.get(self.shape_param)
+        if shape is None:
+            for media_range in parse_accept(request.META.get('HTTP_ACCEPT', '')):
+                if self.shape_param in media_range.params:
+                    shape = media_range.params[self.shape_param]
+                    break
+        if shape is not None and shape not in ('objects', 'columnar'):
+            msg = _('Unknown "{0}": {1}.')
+            raise exceptions.ParseError(msg.format(self.shape_param, shape))
+        return shape
 
 
 class DetailModelMixin(object):
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
+        # May have been loaded by get_last_modified() already
+        if getattr(self, 'object', None) is None:
+            self.object = self.get_object(
+                self.optimize_queryset(self.get_queryset()))
         return {'data': self.serialize(self.object)}
 
+    def get_last_modified(self, request, *args, **kwargs):
+        """
+        The object's `last_modified_field` value, fetched on its own unless
+        there are object permissions to check; the object is loaded, and
+        its permissions checked, before any 304 response then.
+        """
+        if not self.last_modified_field:
+            return None
+        if self._has_object_permissions():
+            self.object = self.get_object(
+                self.optimize_queryset(self.get_queryset()))
+            return getattr(self.object, self.last_modified_field)
+        values = self.get_queryset().filter(**self.get_lookup()) \
+            .values_list(self.last_modified_field, flat=True)[:1]
+        return values[0] if values else None
+
+    def _has_object_permissions(self):
+        default = six.get_unbound_function(
+            BasePermission.has_object_permission)
+        return any(
+            six.get_unbound_function(perm.__class__.has_object_permission)
+            is not default for perm in self.get_permissions())
+
 
 class CreateModelMixin(object):
     def put(self, request, *args, **kwargs):
@@ -1,26 +1,318 @@
+import codecs
+import re
+from io import BytesIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import six
 from django.utils.translation import ugettext as _
 
-from .exceptions import ParseError
+from .encoders import decode_json
+from .exceptions import ParseError, RequestEntityTooLarge
+from .mediatypes import parse_media_type
 from .settings import api_settings
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Characters that matter for finding item boundaries, see _iter_json_items()
+_structural_re = re.compile(r'["\[\]{},]')
+_string_re = re.compile(r'["\\]')
+_structural_bytes_re = re.compile(br'["\[\]{},]')
+_string_bytes_re = re.compile(br'["\\]')
+
+# Tokens that matter for the nesting depth: runs of brackets, and whole
+# strings, skipped in one match. Group 1 is the closing quote, missing if
+# the string goes on in the next chunk, and group 2 a backslash ending the
+# chunk, which escapes the first character of the next one.
+_string_rest = r'[^"\\]*(?:\\.[^"\\]*)*(?:(")|(\\)?\Z)'
+_depth_re = re.compile(r'"%s|[\[{]+|[\]}]+' % _string_rest, re.S)
+_string_rest_re = re.compile(_string_rest, re.S)
+_depth_bytes_re = re.compile(_depth_re.pattern.encode('ascii'), re.S)
+_string_rest_bytes_re = re.compile(_string_rest.encode('ascii'), re.S)
+
+_utf8_charsets = ('utf-8', 'utf8')
+
 
 def parse_content_type(content_type):
-    if ';' in content_type:
-        content_type, params = content_type.split(';', 1)
+    """
+    Split a Content-Type header value into the (lowercased) media type and
+    a dict of parameters.
+    """
+    media_type = parse_media_type(content_type)
+    if media_type is None:
+        return content_type.split(';', 1)[0].strip(), {}
+    return media_type.media_type, dict(media_type.params)
+
+
+def _too_large():
+    return RequestEntityTooLarge(
+        _('Request body exceeds {0} bytes.').format(api_settings.JSON_MAX_BYTES))
+
+
+def _too_deep():
+    return ParseError(
+        _('JSON nested deeper than {0} levels.').format(api_settings.JSON_MAX_DEPTH))
+
+
+def iter_body(request, max_bytes=None, chunk_size=64 * 1024):
+    """
+    Yield the body of `request` in chunks as it's read from the stream,
+    raising :py:class:`RequestEntityTooLarge` as soon as it's known to be
+    longer than `max_bytes`.
+    """
+    if max_bytes is not None:
         try:
-            params = dict(param.split('=') for param in params.split())
-        except Exception:
-            params = {}
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > max_bytes:
+            raise _too_large()
+
+    size = 0
+    while True:
+        chunk = request.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if max_bytes is not None and size > max_bytes:
+            raise _too_large()
+        yield chunk
+
+
+def read_body(request, max_bytes=None, max_depth=None):
+    """
+    Return the body of `request`, reading at most `max_bytes` of it. The
+    body stays available as `request.body` afterwards.
+
+    If `max_depth` is given, the body is checked with
+    :py:func:`check_depth` as it's read.
+    """
+    if (max_bytes is None and max_depth is None) or hasattr(request, '_body'):
+        body = request.body
+        if max_bytes is not None and len(body) > max_bytes:
+            raise _too_large()
+        if max_depth is not None:
+            check_depth(body, max_depth)
+        return body
+
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if max_depth is None and 0 < length <= max_bytes:
+        # Read in one go, rather than joining chunks into a second copy
+        body = request.read(length)
     else:
-        params = {}
-    return content_type, params
+        chunks = iter_body(request, max_bytes)
+        if max_depth is not None:
+            chunks = iter_checked_depth(chunks, max_depth)
+        body = b''.join(chunks)
+    # Same as HttpRequest.body does, so it can still be accessed
+    request._body = body
+    request._stream = BytesIO(body)
+    return body
+
+
+def check_depth(data, max_depth):
+    """
+    Raise ParseError if arrays and objects in the JSON text or UTF-8 encoded
+    bytes `data` nest too deeply.
+    """
+    for chunk in iter_checked_depth([data], max_depth):
+        pass
+
+
+def iter_checked_depth(chunks, max_depth):
+    """
+    Yield the `chunks` of JSON text or UTF-8 encoded bytes, raising
+    ParseError as soon as arrays and objects in them nest too deeply.
+    """
+    depth, in_string, escaped = 0, False, False
+    for chunk in chunks:
+        if isinstance(chunk, six.text_type):
+            depth_re, string_rest_re = _depth_re, _string_rest_re
+            quote, opening = u'"', u'[{'
+        else:
+            depth_re, string_rest_re = _depth_bytes_re, _string_rest_bytes_re
+            quote, opening = b'"', b'[{'
+
+        pos = 0
+        if in_string:
+            # Skip the rest of the string started in a previous chunk
+            match = string_rest_re.match(chunk, 1 if escaped else 0)
+            pos = match.end()
+            in_string = match.group(1) is None
+            escaped = match.group(2) is not None
+        if not in_string:
+            for match in depth_re.finditer(chunk, pos):
+                token = match.group()
+                char = token[:1]
+                if char == quote:
+                    in_string = match.group(1) is None
+                    escaped = match.group(2) is not None
+                elif char in opening:
+                    depth += len(token)
+                    if depth > max_depth:
+                        raise _too_deep()
+                else:
+                    depth -= len(token)
+        yield chunk
 
 
 def parse_json(request, **extra):
+    """
+    Parse a JSON request body. Bodies longer than the ``JSON_MAX_BYTES``
+    setting are rejected with a 413 response before they are read in full,
+    and ones nested deeper than ``JSON_MAX_DEPTH`` with a 400 response.
+    """
     charset = extra.get('charset', 'utf-8')
+    max_depth = api_settings.JSON_MAX_DEPTH
+    if charset.lower() in _utf8_charsets:
+        # UTF-8 bodies are passed on as they are, see decode_json()
+        data = read_body(request, api_settings.JSON_MAX_BYTES, max_depth)
+    else:
+        data = read_body(request, api_settings.JSON_MAX_BYTES)
+        try:
+            data = data.decode(charset)
+        except Exception:
+            raise ParseError()
+        if max_depth is not None:
+            check_depth(data, max_depth)
+    try:
+        return decode_json(data)
+    except Exception:
+        raise ParseError()
+
+
+def parse_json_items(request, **extra):
+    """
+    Parse a JSON array request body incrementally, returning a generator
+    of its items. The body is read from the stream as the items are
+    consumed, and only one item is held in memory at a time.
+
+    The ``JSON_MAX_BYTES`` and ``JSON_MAX_DEPTH`` limits apply as with
+    :py:func:`parse_json`; errors are raised while iterating. To use it
+    for an endpoint::
+
+        data_parsers = dict(Endpoint.data_parsers,
+            **{'application/json': parse_json_items})
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(extra.get('charset', 'utf-8'))()
+    except LookupError:
+        raise ParseError()
+    return _iter_json_items(iter_body(request, api_settings.JSON_MAX_BYTES),
+        decoder, api_settings.JSON_MAX_DEPTH)
+
+
+def _decode_item(text):
+    if not text.strip():
+        raise ParseError()
+    try:
+        return decode_json(text)
+    except Exception:
+        raise ParseError()
+
+
+def _iter_json_items(chunks, decoder, max_depth):
+    buf, pos, start = '', 0, None
+    depth, in_string, done, seen_items = 0, False, False, False
+    search = _structural_re.search
+
+    for chunk in chunks:
+        try:
+            buf += decoder.decode(chunk)
+        except UnicodeDecodeError:
+            raise ParseError()
+        if done:
+            if buf.strip():
+                raise ParseError()
+            buf = ''
+            continue
+
+        while True:
+            if in_string:
+                match = _string_re.search(buf, pos)
+                if match is None:
+                    pos = len(buf)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buf):
+                        # The escaped character is in the next chunk
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                in_string, pos = False, match.end()
+                continue
+
+            match = search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                if start is None and buf.strip():
+                    raise ParseError()
+                break
+            char, index, pos = match.group(), match.start(), match.end()
+
+            if start is None:
+                # The opening bracket of the array
+                if char != '[' or buf[:index].strip():
+                    raise ParseError()
+                depth, start = 1, pos
+            elif char == '"':
+                in_string = True
+            elif char in '[{':
+                depth += 1
+                if max_depth is not None and depth > max_depth:
+                    raise _too_deep()
+            elif char in ']}':
+                depth -= 1
+                if depth == 0:
+                    if char != ']':
+                        raise ParseError()
+                    item = buf[start:index]
+                    if item.strip() or seen_items:
+                        yield _decode_item(item)
+                    done = True
+                    if buf[pos:].strip():
+                        raise ParseError()
+                    buf = ''
+                    break
+            elif char == ',' and depth == 1:
+                yield _decode_item(buf[start:index])
+                seen_items = True
+                # Drop the consumed text
+                buf, pos, start = buf[pos:], 0, 0
+
+    try:
+        trailing = decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        raise ParseError()
+    if not done or trailing.strip():
+        raise ParseError()
+
+
+def parse_msgpack(request, **extra):
+    if msgpack is None:
+        raise ImproperlyConfigured('parse_msgpack requires msgpack.')
+    try:
+        return msgpack.unpackb(request.body, raw=False)
+    except Exception:
+        raise ParseError()
+
+
+def parse_cbor(request, **extra):
+    if cbor2 is None:
+        raise ImproperlyConfigured('parse_cbor requires cbor2.')
     try:
-        data = request.body.decode(charset)
-        return api_settings.JSON_DECODER().decode(data)
+        return cbor2.loads(request.body)
     except Exception:
         raise ParseError()
 
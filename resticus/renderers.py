@@ -0,0 +1,93 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.timezone import utc
+
+from .encoders import _default, encode_json
+from .mediatypes import match, parse_accept, parse_media_type
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+__all__ = ['JSONRenderer', 'MessagePackRenderer', 'CBORRenderer',
+    'select_renderer']
+
+
+class JSONRenderer(object):
+    """Renders data with the ``JSON_ENCODER`` backend."""
+    media_type = 'application/json'
+    media_types = ('application/json',)
+
+    def render(self, data):
+        return encode_json(data)
+
+
+class MessagePackRenderer(object):
+    """
+    Renders data as MessagePack. Types MessagePack doesn't have (Decimals,
+    dates and times, lazy strings) are formatted as in JSON.
+    """
+    media_type = 'application/msgpack'
+    media_types = ('application/msgpack', 'application/x-msgpack')
+
+    def __init__(self):
+        if msgpack is None:
+            raise ImproperlyConfigured('MessagePackRenderer requires msgpack.')
+
+    def render(self, data):
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def _cbor_default(encoder, value):
+    encoder.encode(_default(value))
+
+
+class CBORRenderer(object):
+    """
+    Renders data as CBOR (requires cbor2 5.0+). Decimals, dates and times
+    use the native CBOR tags; naive datetimes are assumed to be in UTC.
+    """
+    media_type = 'application/cbor'
+    media_types = ('application/cbor',)
+
+    def __init__(self):
+        if cbor2 is None:
+            raise ImproperlyConfigured('CBORRenderer requires cbor2.')
+
+    def render(self, data):
+        return cbor2.dumps(data, default=_cbor_default, timezone=utc,
+            date_as_datetime=True)
+
+
+def select_renderer(accept, renderers):
+    """
+    Return the renderer class among `renderers` best matching the Accept
+    header value `accept`, or the first one if none is acceptable.
+
+    Each media type gets the q-value of the most specific media range
+    matching it (see :py:func:`resticus.mediatypes.match`). Renderers are
+    ranked by that q-value, then by the specificity and order of the
+    range; ties are resolved by their order in `renderers`.
+    """
+    if not accept or len(renderers) == 1:
+        return renderers[0]
+
+    ranges = parse_accept(accept)
+    best, best_key = renderers[0], None
+    for index, renderer in enumerate(renderers):
+        for media_type in renderer.media_types:
+            media_type = parse_media_type(media_type)
+            key = None
+            for position, media_range in enumerate(ranges):
+                specificity = match(media_range, media_type)
+                if specificity >= 0 and (key is None or specificity > key[1]):
+                    key = (media_range.q, specificity, -position, -index)
+            if key is not None and key[0] > 0 and \
+                    (best_key is None or key > best_key):
+                best, best_key = renderer, key
+    return best
@@ -16,6 +16,13 @@ DEFAULTS = {
     ),
     'JSON_DECODER': 'resticus.encoders.JSONDecoder',
     'JSON_ENCODER': 'resticus.encoders.JSONEncoder',
+    'DECIMAL_FORMAT': None,
+    'JSON_MAX_BYTES': None,
+    'JSON_MAX_DEPTH': None,
+    'USE_ETAGS': True,
+    'COMPRESSION': True,
+    'COMPRESSION_MIN_SIZE': 1024,
+    'COMPRESSION_LEVEL': None,
     'LOGIN_REQUIRED': False,
     'TOKEN_MODEL': None,
     'DATA_PARSERS': {
@@ -23,7 +30,10 @@ DEFAULTS = {
         'application/x-www-form-urlencoded': 'resticus.parsers.parse_post',
         'multipart/form-data': 'resticus.parsers.parse_post',
         'text/plain': 'resticus.parsers.parse_plain_text'
-    }
+    },
+    'RENDERERS': (
+        'resticus.renderers.JSONRenderer',
+    ),
 }
 
 try:
@@ -33,12 +43,28 @@ try:
 except ImportError:
     pass
 
+try:
+    import msgpack
+    DEFAULTS['RENDERERS'] += ('resticus.renderers.MessagePackRenderer',)
+    DEFAULTS['DATA_PARSERS']['application/msgpack'] = 'resticus.parsers.parse_msgpack'
+    DEFAULTS['DATA_PARSERS']['application/x-msgpack'] = 'resticus.parsers.parse_msgpack'
+except ImportError:
+    pass
+
+try:
+    import cbor2
+    DEFAULTS['RENDERERS'] += ('resticus.renderers.CBORRenderer',)
+    DEFAULTS['DATA_PARSERS']['application/cbor'] = 'resticus.parsers.parse_cbor'
+except ImportError:
+    pass
+
 IMPORT_STRINGS = (
     'DEFAULT_AUTHENTICATION_CLASSES',
     'DEFAULT_PERMISSION_CLASSES',
     'JSON_DECODER',
     'JSON_ENCODER',
     'DATA_PARSERS',
+    'RENDERERS',
 )
 
 
@@ -106,14 +132,24 @@ class APISettings(object):
         setattr(self, attr, val)
         return val
 
+    def reload(self, user_settings=None):
+        """
+        Replace the user settings, dropping the cached values. The instance
+        is updated in place, so modules holding a reference to it see the
+        new settings.
+        """
+        for attr in list(self.__dict__):
+            if attr in self.defaults:
+                delattr(self, attr)
+        self.user_settings = user_settings or {}
+
 
 api_settings = APISettings(USER_SETTINGS, DEFAULTS, IMPORT_STRINGS)
 
 
 def reload_api_settings(*args, **kwargs):
-    global api_settings
     setting, value = kwargs['setting'], kwargs['value']
     if setting == 'RESTICUS':
-        api_settings = APISettings(value, DEFAULTS, IMPORT_STRINGS)
+        api_settings.reload(value)
 
 setting_changed.connect(reload_api_settings)
@@ -1,53 +1,730 @@
+import contextlib
+import inspect
+import itertools
+import operator
+import re
+import threading
+import types
+
 import six
 
+from django.core.exceptions import FieldDoesNotExist
 from django.db import models
+from django.db.models import Prefetch
+from django.db.models.constants import LOOKUP_SEP
+from django.test.signals import setting_changed
 from django.utils.encoding import force_text
 
-__all__ = ['serialize', 'flatten']
+from .compat import ModelIterable, prefetch_related_objects, queryset_iterator
+from .settings import api_settings
+
+__all__ = ['serialize', 'serialize_chunks', 'batch', 'flatten',
+    'get_columns', 'iter_chunks', 'narrow_fields', 'optimize_queryset',
+    'parse_field_selection', 'register_serializer']
+
+
+_spec_cache = {}
+_SPEC_CACHE_SIZE = 512
+
+# Per-thread state of the serialization in progress
+_local = threading.local()
+
+
+def _clear_spec_cache(*args, **kwargs):
+    # Compiled plans depend on the settings
+    if kwargs['setting'] == 'RESTICUS':
+        _spec_cache.clear()
+
+
+setting_changed.connect(_clear_spec_cache)
+
+
+def _freeze(value):
+    """Turn a (possibly nested) field spec into a hashable cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class SerializationSpec(object):
+    """
+    A normalized (fields, include, exclude, fixup) serialization spec.
+
+    Specs are model-agnostic; the model-specific work is done once per
+    model class by :py:meth:`plan` and the result is cached on the spec.
+    Use :py:func:`get_spec` to get a shared, cached instance.
+    """
+
+    def __init__(self, fields=None, include=None, exclude=None, fixup=None):
+        self.fields = fields
+        self.include = include
+        self.exclude = exclude
+        self.fixup = fixup
+        self._plans = {}
+
+    def plan(self, model):
+        try:
+            return self._plans[model]
+        except KeyError:
+            plan = self._plans[model] = SerializationPlan(model, self)
+            return plan
+
+    def serialize(self, src):
+        """Serialize `src` (a model, queryset, list...) using this spec."""
+        return _serialize(src, self)
+
+
+def get_spec(fields=None, include=None, exclude=None, fixup=None,
+        related=None):
+    """
+    Return the shared :py:class:`SerializationSpec` for the given options.
+
+    Specs containing unhashable values can't be cached, and get a fresh
+    instance on every call.
+    """
+    try:
+        key = _freeze((fields, include, exclude, fixup))
+        return _spec_cache[key]
+    except TypeError:
+        return SerializationSpec(fields, include, exclude, fixup)
+    except KeyError:
+        if len(_spec_cache) >= _SPEC_CACHE_SIZE:
+            _spec_cache.clear()
+        spec = _spec_cache[key] = SerializationSpec(fields, include,
+            exclude, fixup)
+        return spec
+
+
+def _identity(value):
+    return value
+
+
+def _force_text(value):
+    return force_text(value, strings_only=True)
+
+
+def _text(value):
+    if value is None or value.__class__ is six.text_type:
+        return value
+    return force_text(value, strings_only=True)
+
+
+def _file(value):
+    # FieldFile from model instances, the file name string from values()
+    return getattr(value, 'name', value) or ''
+
+
+def _decimal_converter(field):
+    fmt = api_settings.DECIMAL_FORMAT
+    if fmt == 'string':
+        return lambda value: value if value is None else str(value)
+    if fmt == 'number':
+        return lambda value: value if value is None else float(value)
+    # Left to the JSON encoder
+    return None
+
+
+def _related_converter(field):
+    return get_field_converter(field.target_field)
+
+
+# Converter factories for model field classes; a factory takes the model
+# field and returns a function converting its values for serialization,
+# or None if the values can be used as they are.
+_field_converters = {
+    models.AutoField: lambda field: None,
+    models.IntegerField: lambda field: None,
+    models.FloatField: lambda field: None,
+    models.BooleanField: lambda field: None,
+    models.NullBooleanField: lambda field: None,
+    models.CharField: lambda field: _text,
+    models.TextField: lambda field: _text,
+    models.DateTimeField: lambda field: None,
+    models.DateField: lambda field: None,
+    models.DecimalField: _decimal_converter,
+    models.FileField: lambda field: _file,
+    models.ForeignKey: _related_converter,
+}
+
+
+def get_field_converter(field):
+    """
+    Return the function converting values of the model `field` for
+    serialization (None if no conversion is needed). Fields of unknown
+    types, and subclasses of known ones changing how values are loaded
+    (eg. returning enums from an IntegerField), are converted with
+    `force_text(value, strings_only=True)`.
+    """
+    mro = inspect.getmro(field.__class__)
+    for i, cls in enumerate(mro):
+        if cls in _field_converters:
+            if any(name in base.__dict__ for base in mro[:i]
+                    for name in ('from_db_value', 'to_python')):
+                break
+            return _field_converters[cls](field)
+    return _force_text
+
+
+class SerializationPlan(object):
+    """
+    A serialization spec compiled for a single model class.
+
+    All the model introspection and fields/include/exclude list handling
+    is done once, in the constructor. Calling the plan with a model
+    instance serializes it.
+    """
+
+    def __init__(self, model, spec):
+        self.model = model
+        self.fixup = spec.fixup
+
+        fieldmap = {}
+        for f in model._meta.concrete_model._meta.local_fields:
+            fieldmap[f.name] = f
+
+        if spec.fields is None:
+            fields = list(fieldmap.keys())
+        else:
+            fields = list(spec.fields)
+
+        if spec.exclude is not None:
+            fields = [f for f in fields if f not in spec.exclude]
+
+        if spec.include is not None:
+            for i in spec.include:
+                if isinstance(i, tuple) or (isinstance(i, six.string_types)):
+                    fields.append(i)
+        self.fields = fields
+
+        # (key, attname, converter) triples, as long as every field is a
+        # concrete column;
+        # such plans can serialize straight from `QuerySet.values_list()`.
+        self.columns = [] if self.fixup is None else None
+
+        # names of the concrete fields read by the plan, if they are known;
+        # used to narrow prefetched querysets with `only()`.
+        self.only = [] if self.fixup is None else None
+        self.nested_specs = []
+        self.batches = []
+        self._related_lookups = None
+        self._batched_nested = None
+
+        self.getters = []
+        for f in fields:
+            if isinstance(f, six.string_types):
+                if f in fieldmap:
+                    attname = fieldmap[f].attname
+                    converter = get_field_converter(fieldmap[f])
+                else:
+                    attname, converter = f, _force_text
+                self.getters.append((f, self.attribute(attname, converter)))
+                if self.columns is not None:
+                    if f in fieldmap:
+                        self.columns.append((f, attname, converter))
+                    else:
+                        self.columns = None
+                if self.only is not None:
+                    if f in fieldmap:
+                        self.only.append(f)
+                    else:
+                        self.only = None
+            elif isinstance(f, tuple):
+                self.columns = None
+                k, v = f
+                if isinstance(v, BatchField):
+                    self.only = None
+                    self.batches.append((k, v))
+                    self.getters.append((k, None))
+                elif callable(v):
+                    self.only = None
+                    self.getters.append((k, v))
+                elif isinstance(v, dict):
+                    nested_spec = get_spec(**v)
+                    self.nested_specs.append((k, nested_spec))
+                    self.getters.append((k, self.nested(k, nested_spec)))
+
+        # The keys of the serialized dicts, in order, if they are known in
+        # advance; plans with known keys can produce columnar output.
+        keys = [key for key, get in self.getters]
+        if self.fixup is None and len(set(keys)) == len(keys):
+            self.keys = keys
+        else:
+            self.keys = None
+
+    @staticmethod
+    def attribute(attname, converter):
+        getter = operator.attrgetter(attname)
+        if converter is None:
+            return getter
+
+        def get(obj):
+            return converter(getter(obj))
+        return get
+
+    @staticmethod
+    def nested(attname, spec):
+        getter = operator.attrgetter(attname)
+
+        def get(obj):
+            return _serialize(getter(obj), spec)
+        return get
+
+    def __call__(self, obj):
+        if self.has_batches() or \
+                getattr(_local, 'identity_map', None) is not None:
+            return self.serialize_many([obj])[0]
+        return self.serialize_row(obj, self.getters)
+
+    def serialize_row(self, obj, getters):
+        data = {key: get(obj) for key, get in getters}
+        if self.fixup:
+            data = self.fixup(obj, data)
+        return data
+
+    def serialize_many(self, objs):
+        """
+        Serialize a list of instances of the plan's model, computing the
+        batched fields once for the whole list.
+
+        Inside a serialization using an identity map, objects already
+        serialized with this plan are reused rather than serialized again.
+        """
+        memo = getattr(_local, 'identity_map', None)
+        if memo is None:
+            return self._serialize_many(objs)
+
+        result = [None if obj.pk is None else memo.get((self, obj.pk))
+            for obj in objs]
+        missing = [i for i, data in enumerate(result) if data is None]
+        if missing:
+            rows = self._serialize_many([objs[i] for i in missing])
+            for i, data in zip(missing, rows):
+                result[i] = data
+                if objs[i].pk is not None:
+                    memo[(self, objs[i].pk)] = data
+        return result
+
+    def _serialize_many(self, objs):
+        getters = self.bind(objs)
+        return [self.serialize_row(obj, getters) for obj in objs]
+
+    def has_batches(self):
+        """Whether the plan, or a nested plan, has batched fields."""
+        return bool(self.batches or self.batched_nested())
+
+    def batched_nested(self):
+        """The keys of the nested related specs with batched fields."""
+        if self._batched_nested is not None:
+            return self._batched_nested
+
+        keys = set()
+        for key, spec in self.nested_specs:
+            try:
+                field = self.model._meta.get_field(key)
+            except FieldDoesNotExist:
+                continue
+            if field.is_relation and field.related_model is not None and \
+                    spec.plan(field.related_model).has_batches():
+                keys.add(key)
+        self._batched_nested = keys
+        return keys
+
+    def bind(self, objs):
+        """
+        Return the getters with batched fields resolved for `objs`. The
+        related objects of nested specs with batched fields are serialized
+        together, so their batched fields are computed once for all of
+        `objs` rather than once per object.
+        """
+        batched_nested = self.batched_nested()
+        if not self.batches and not batched_nested:
+            return self.getters
+        values = dict((key, fn(objs)) for key, fn in self.batches)
+        for key, spec in self.nested_specs:
+            if key in batched_nested:
+                values[key] = self.serialize_nested(objs, key, spec)
+        return [(key, values[key].get if key in values else get)
+            for key, get in self.getters]
+
+    @staticmethod
+    def serialize_nested(objs, attname, spec):
+        """
+        Serialize the `attname` related object(s) of every object in `objs`
+        with `spec`, all at once. Returns a dict mapping the objects to
+        their serialized related object(s).
+        """
+        getter = operator.attrgetter(attname)
+        related, instances = [], {}
+        for obj in objs:
+            value = getter(obj)
+            if isinstance(value, models.Manager):
+                value = list(value.all())
+                for item in value:
+                    instances.setdefault(item.__class__, []).append(item)
+            elif isinstance(value, models.Model):
+                instances.setdefault(value.__class__, []).append(value)
+            related.append(value)
+
+        serialized = {}
+        for cls, items in instances.items():
+            for item, data in zip(items, spec.plan(cls).serialize_many(items)):
+                serialized[id(item)] = data
+
+        result = {}
+        for obj, value in zip(objs, related):
+            if isinstance(value, list):
+                result[obj] = [serialized[id(item)] for item in value]
+            elif isinstance(value, models.Model):
+                result[obj] = serialized[id(value)]
+            else:
+                result[obj] = _serialize(value, spec)
+        return result
+
+    def serialize_rows(self, objs):
+        """
+        Serialize a list of instances as lists of values, in the order of
+        :py:attr:`keys`. Only available for plans with known keys.
+        """
+        getters = [get for key, get in self.bind(objs)]
+        return [[get(obj) for get in getters] for obj in objs]
+
+    def related_lookups(self):
+        """
+        Return a `(select_related, prefetch_related)` pair of lookup lists
+        covering the related objects this plan serializes.
+
+        Forward foreign keys and one-to-one relations are followed with
+        `select_related()`; reverse foreign keys and many-to-many relations
+        get a `Prefetch` whose queryset is optimized (and, when the nested
+        fields are known, narrowed with `only()`) the same way.
+        """
+        if self._related_lookups is not None:
+            return self._related_lookups
+
+        select, prefetch = [], []
+        for key, spec in self.nested_specs:
+            try:
+                field = self.model._meta.get_field(key)
+            except FieldDoesNotExist:
+                continue
+            if not field.is_relation or field.related_model is None:
+                continue
+
+            child = spec.plan(field.related_model)
+            if field.many_to_one or field.one_to_one:
+                child_select, child_prefetch = child.related_lookups()
+                select.append(key)
+                select.extend(LOOKUP_SEP.join((key, lookup))
+                    for lookup in child_select)
+                prefetch.extend(Prefetch(
+                    LOOKUP_SEP.join((key, lookup.prefetch_through)),
+                    queryset=lookup.queryset) for lookup in child_prefetch)
+            elif field.one_to_many or field.many_to_many:
+                queryset = child.optimize(
+                    field.related_model._default_manager.all())
+                only = child.only_fields()
+                if only is not None:
+                    if field.one_to_many:
+                        # The reverse foreign key is needed to match the
+                        # prefetched objects with their parents.
+                        only.append(field.field.name)
+                    queryset = queryset.only(*only)
+                prefetch.append(Prefetch(key, queryset=queryset))
+
+        self._related_lookups = (select, prefetch)
+        return self._related_lookups
+
+    def only_fields(self):
+        """
+        Names of the fields to load with `only()` to serialize instances
+        with this plan, or None if they can't be known.
+        """
+        if self.only is None:
+            return None
+        # Relations followed with select_related() can't be deferred.
+        return self.only + [lookup for lookup in self.related_lookups()[0]
+            if LOOKUP_SEP not in lookup]
+
+    def optimize(self, queryset):
+        select, prefetch = self.related_lookups()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            seen = set(getattr(lookup, 'prefetch_to', lookup)
+                for lookup in queryset._prefetch_related_lookups)
+            prefetch = [lookup for lookup in prefetch
+                if lookup.prefetch_to not in seen]
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def can_use_values(self, queryset):
+        """
+        Whether `queryset` can be serialized from plain column values,
+        skipping model instance construction altogether.
+
+        Distinct querysets can't: selecting fewer columns would make the
+        distinct apply to those columns only, and merge rows.
+        """
+        return (self.columns is not None and
+            queryset._result_cache is None and
+            ModelIterable is not None and
+            getattr(queryset, '_iterable_class', None) is ModelIterable and
+            not queryset.query.annotations and
+            not queryset.query.extra and
+            not queryset.query.distinct)
+
+    def serialize_values(self, rows):
+        keys = [key for key, attname, converter in self.columns]
+        return [dict(zip(keys, row)) for row in self.convert_values(rows)]
+
+    def convert_values(self, rows):
+        """Convert `values_list()` rows to lists of serialized values."""
+        converters = [converter for key, attname, converter in self.columns]
+        if not any(converters):
+            return [list(row) for row in rows]
+        converters = [converter or _identity for converter in converters]
+        return [[c(v) for c, v in zip(converters, row)] for row in rows]
+
+    def values(self, queryset):
+        return queryset.values_list(
+            *[attname for key, attname, converter in self.columns])
 
 
 def serialize_model(obj, fields=None, include=None, exclude=None,
         fixup=None):
+    spec = get_spec(fields, include, exclude, fixup)
+    return spec.plan(obj.__class__)(obj)
 
-    fieldmap = {}
-    for f in obj._meta.concrete_model._meta.local_fields:
-        fieldmap[f.name] = f.attname
 
-    def getfield(f):
-        return getattr(obj, fieldmap.get(f, f))
+def optimize_queryset(queryset, fields=None, include=None, exclude=None,
+        fixup=None, only=True):
+    """
+    Add the `select_related()` and `prefetch_related()` lookups needed to
+    serialize the objects in `queryset` with the given spec without running
+    a query per related object.
 
-    if fields is None:
-        fields = list(fieldmap.keys())
-    else:
-        fields = list(fields)
+    If `only` is true and the spec only reads concrete fields, the queryset
+    is also restricted to them with `only()`, unless it already defers some
+    fields.
+    """
+    plan = get_spec(fields, include, exclude, fixup).plan(queryset.model)
+    queryset = plan.optimize(queryset)
+    if not only:
+        return queryset
 
-    if exclude is not None:
-        fields = [f for f in fields if f not in exclude]
+    only = plan.only_fields()
+    deferred, defer = queryset.query.deferred_loading
+    if (only is not None and not deferred and defer and
+            getattr(queryset, '_iterable_class', None) is ModelIterable):
+        queryset = queryset.only(*only)
+    return queryset
 
-    if include is not None:
-        for i in include:
-            if isinstance(i, tuple) or (isinstance(i, six.string_types)):
-                fields.append(i)
 
-    data = {}
-    for f in fields:
-        if isinstance(f, six.string_types):
-            data[f] = force_text(getfield(f), strings_only=True)
-        elif isinstance(f, tuple):
-            k, v = f
-            if callable(v):
-                data[k] = v(obj)
-            elif isinstance(v, dict):
-                data[k] = serialize(getattr(obj, k), **v)
+def parse_field_selection(value):
+    """
+    Parse a field selection like `id,name,books(title,publisher(name))`
+    into a dict mapping the selected names to None, or to the dict of the
+    nested selection. Raises ValueError if the selection is malformed.
+    """
+    stack, last = [{}], None
+    for token in re.findall(r'[^,()\s]+|[,()]', value):
+        if token == ',':
+            last = None
+        elif token == '(':
+            if last is None:
+                raise ValueError(value)
+            stack[-1][last] = {}
+            stack.append(stack[-1][last])
+            last = None
+        elif token == ')':
+            if len(stack) == 1:
+                raise ValueError(value)
+            stack.pop()
+            last = None
+        else:
+            stack[-1][token] = None
+            last = token
+    if len(stack) != 1:
+        raise ValueError(value)
+    return stack[0]
+
+
+def narrow_fields(model, selection, fields=None, include=None, exclude=None):
+    """
+    Restrict the attribute descriptions serialized for `model` to those
+    named in `selection` (see :py:func:`parse_field_selection`), recursing
+    into nested related specs. Names that aren't part of the spec are
+    ignored, so the spec acts as a whitelist.
+
+    Returns the list of attribute descriptions to use as `fields`.
+    """
+    plan = get_spec(fields, include, exclude).plan(model)
+    result = []
+    for entry in plan.fields:
+        key = entry if isinstance(entry, six.string_types) else entry[0]
+        if key not in selection:
+            continue
+        nested = selection[key]
+        if (nested is not None and isinstance(entry, tuple) and
+                isinstance(entry[1], dict)):
+            try:
+                related_model = model._meta.get_field(key).related_model
+            except FieldDoesNotExist:
+                related_model = None
+            if related_model is not None:
+                options = entry[1]
+                entry = (key, dict(fixup=options.get('fixup'),
+                    fields=narrow_fields(related_model, nested,
+                        options.get('fields'), options.get('include'),
+                        options.get('exclude'))))
+        result.append(entry)
+    return result
+
+
+def _serialize(src, spec):
+    try:
+        handler = _handlers[src.__class__]
+    except KeyError:
+        handler = _handlers[src.__class__] = _resolve_handler(src.__class__)
+    if handler is None:
+        return src
+    return handler(src, spec)
 
-    if fixup:
-        data = fixup(obj, data)
 
-    return data
+def _resolve_handler(cls):
+    for base in inspect.getmro(cls):
+        if base in _serializers:
+            return _serializers[base]
+    return None
+
+
+def register_serializer(cls, handler):
+    """
+    Register a function serializing instances of `cls` (and its subclasses,
+    unless they have a handler of their own) for :py:func:`serialize`.
+
+    The handler is called as `handler(obj, spec)`, where `spec` is the
+    :py:class:`SerializationSpec` in effect; use `spec.serialize(value)` to
+    serialize nested values with the same options. Values of types without
+    a handler are returned as they are.
+
+    Example::
+
+        register_serializer(uuid.UUID, lambda obj, spec: obj.hex)
+    """
+    _serializers[cls] = handler
+    _handlers.clear()
+
+
+def _serialize_manager(src, spec):
+    return _serialize_queryset(src.all(), spec)
+
+
+def _serialize_queryset(src, spec):
+    plan = spec.plan(src.model)
+    if plan.can_use_values(src):
+        return plan.serialize_values(plan.values(src))
+    return _serialize_list(list(src), spec)
+
+
+def _serialize_list(items, spec):
+    plan = _homogeneous_plan(items, spec)
+    if plan is not None:
+        return plan.serialize_many(items)
+    return [_serialize(i, spec) for i in items]
+
+
+def _serialize_columnar(src, spec):
+    if isinstance(src, models.Manager):
+        src = src.all()
+
+    if isinstance(src, models.query.QuerySet):
+        plan = spec.plan(src.model)
+        if plan.keys is not None:
+            if plan.can_use_values(src):
+                rows = plan.convert_values(plan.values(src))
+            else:
+                rows = plan.serialize_rows(list(src))
+            return {'columns': list(plan.keys), 'rows': rows}
+
+    items = list(src)
+    plan = _homogeneous_plan(items, spec)
+    if plan is not None and plan.keys is not None:
+        return {'columns': list(plan.keys), 'rows': plan.serialize_rows(items)}
+
+    # Keys aren't known in advance, gather them from the serialized dicts
+    data = _serialize_list(items, spec)
+    columns, seen = [], set()
+    for item in data:
+        for key in item:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return {
+        'columns': columns,
+        'rows': [[item.get(key) for key in columns] for item in data],
+    }
+
+
+def _homogeneous_plan(items, spec):
+    if items and isinstance(items[0], models.Model):
+        model = items[0].__class__
+        if all(i.__class__ is model for i in items):
+            return spec.plan(model)
+    return None
+
+
+def _serialize_iterable(src, spec):
+    return _serialize_list(list(src), spec)
+
+
+def _serialize_generator(src, spec):
+    return (_serialize(i, spec) for i in src)
+
+
+def _serialize_dict(src, spec):
+    return dict((k, _serialize(v, spec)) for k, v in src.items())
+
+
+def _serialize_model(src, spec):
+    return spec.plan(src.__class__)(src)
+
+
+_sequence_types = (models.Manager, models.query.QuerySet, list, tuple, set,
+    frozenset, types.GeneratorType)
+
+# Handlers registered by type, and the handlers resolved for exact types
+_serializers = {
+    models.Manager: _serialize_manager,
+    models.query.QuerySet: _serialize_queryset,
+    list: _serialize_list,
+    tuple: _serialize_iterable,
+    set: _serialize_iterable,
+    frozenset: _serialize_iterable,
+    types.GeneratorType: _serialize_generator,
+    dict: _serialize_dict,
+    models.Model: _serialize_model,
+}
+_handlers = {}
+
+
+@contextlib.contextmanager
+def _identity_map(identity_map):
+    if identity_map is None or identity_map is False:
+        yield
+        return
+    previous = getattr(_local, 'identity_map', None)
+    _local.identity_map = {} if identity_map is True else identity_map
+    try:
+        yield
+    finally:
+        _local.identity_map = previous
 
 
 def serialize(src, fields=None, related=None, include=None, exclude=None,
-        fixup=None):
+        fixup=None, identity_map=False, columnar=False):
     """Serialize Model or a QuerySet instance to Python primitives.
 
     By default, all the model fields (and only the model fields) are
@@ -72,6 +749,11 @@ def serialize(src, fields=None, related=None, include=None, exclude=None,
         object being serialized as the argument, and the function result will
         be included in the result, with the key being the first tuple element
 
+      * a tuple, where the first element is a string key and the second
+        is a function wrapped with :py:func:`batch` - the function will be
+        run once with the list of objects being serialized, and must return
+        a dict mapping each object to its value
+
       * a tuple, where the first element is a related model attribute name
         and the second is a dictionary - related model instance(s) will
         be serialized recursively and added as sub-object(s) to the object
@@ -86,6 +768,29 @@ def serialize(src, fields=None, related=None, include=None, exclude=None,
     use is discouraged if the same result can be obtained through the
     attribute descriptions.
 
+    The spec is compiled into a :py:class:`SerializationPlan` once per model
+    class, and the plan is cached and reused for every object serialized
+    with the same spec, so the model introspection isn't repeated per row.
+
+    Lists, tuples and sets are serialized as lists, generators lazily as
+    generators, and dicts as dicts, with their items serialized
+    recursively. Handlers for other types can be added with
+    :py:func:`register_serializer`; anything else is returned as is, so
+    pre-encoded :py:class:`resticus.encoders.RawJSON` values are passed
+    through to the encoder.
+
+    If `identity_map` is true, model instances are serialized only once per
+    call for each spec they are serialized with; when the same object (by
+    primary key) shows up again, eg. the author of many books, its
+    serialized dict is reused. The reused dicts are shared, so they must
+    not be modified. A dict can be passed instead of `True` to share the
+    identity map between calls.
+
+    If `columnar` is true and `src` is a QuerySet, manager, list, tuple, set
+    or generator, the result is a dict with a list of the serialized keys
+    in `columns`, and a list of value lists (one per object, in the order
+    of `columns`) in `rows`, instead of a list of dicts.
+
     The `related` argument (a different way of specifying related
     objects to be serialized) is deprecated and included only for backwards
     compatibility.
@@ -112,27 +817,119 @@ def serialize(src, fields=None, related=None, include=None, exclude=None,
     serializator.
     """
 
-    def subs(subsrc):
-        return serialize(subsrc, fields=fields, include=include,
-            exclude=exclude, fixup=fixup)
+    spec = get_spec(fields, include, exclude, fixup)
+    with _identity_map(identity_map):
+        if columnar and isinstance(src, _sequence_types):
+            return _serialize_columnar(src, spec)
+        return _serialize(src, spec)
+
+
+def serialize_chunks(src, chunk_size, fields=None, include=None,
+        exclude=None, fixup=None, identity_map=False, columnar=False):
+    """
+    Serialize an iterable of model instances (usually a QuerySet) in chunks.
+
+    Yields lists of at most `chunk_size` serialized objects. Querysets are
+    read with `QuerySet.iterator()`, so only one chunk of rows is held in
+    memory at a time; their `prefetch_related()` lookups are done per chunk.
+    The serialization options are the same as for :py:func:`serialize`;
+    the identity map, if used, is shared by all the chunks.
 
+    With `columnar`, the chunks contain lists of values in the order given
+    by :py:func:`get_columns`, which must be known for the spec.
+    """
+    spec = get_spec(fields, include, exclude, fixup)
+    if identity_map is True:
+        identity_map = {}
+
+    if isinstance(src, models.Manager):
+        src = src.all()
+
+    def serialize_chunk(chunk):
+        with _identity_map(identity_map):
+            if not columnar:
+                return _serialize_list(chunk, spec)
+            plan = _homogeneous_plan(chunk, spec)
+            if plan is None or plan.keys is None:
+                raise ValueError('Columnar chunks need model instances '
+                    'serialized with known keys (no fixup).')
+            return plan.serialize_rows(chunk)
+
+    if isinstance(src, models.query.QuerySet) and src._result_cache is None:
+        plan = spec.plan(src.model)
+        if plan.can_use_values(src) and not (columnar and plan.keys is None):
+            rows = queryset_iterator(plan.values(src), chunk_size)
+            for chunk in _chunked(rows, chunk_size):
+                if columnar:
+                    yield plan.convert_values(chunk)
+                else:
+                    yield plan.serialize_values(chunk)
+            return
+
+    for chunk in iter_chunks(src, chunk_size):
+        yield serialize_chunk(chunk)
+
+
+def iter_chunks(src, chunk_size):
+    """
+    Yield lists of at most `chunk_size` items of `src`. Querysets are read
+    with `QuerySet.iterator()`, doing their `prefetch_related()` lookups
+    per chunk.
+    """
     if isinstance(src, models.Manager):
-        return [subs(i) for i in src.all()]
+        src = src.all()
 
-    elif (isinstance(src, list) or
-            isinstance(src, models.query.QuerySet) or
-            isinstance(src, set)):
-        return [subs(i) for i in src]
+    if isinstance(src, models.query.QuerySet) and src._result_cache is None:
+        lookups = src._prefetch_related_lookups
+        for chunk in _chunked(queryset_iterator(src, chunk_size), chunk_size):
+            if lookups:
+                prefetch_related_objects(chunk, *lookups)
+            yield chunk
+        return
 
-    elif isinstance(src, dict):
-        return dict((k, subs(v)) for k, v in src.items())
+    for chunk in _chunked(src, chunk_size):
+        yield chunk
 
-    elif isinstance(src, models.Model):
-        return serialize_model(src, fields=fields, include=include,
-            exclude=exclude, fixup=fixup)
 
-    else:
-        return src
+def get_columns(model, fields=None, include=None, exclude=None, fixup=None):
+    """
+    Return the keys of the dicts serializing `model` instances with the
+    given spec, in order, or None if they can't be known in advance (eg.
+    when there's a fixup function).
+    """
+    keys = get_spec(fields, include, exclude, fixup).plan(model).keys
+    return None if keys is None else list(keys)
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+class BatchField(object):
+    """A field function computing its values for many objects at once."""
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __call__(self, objs):
+        return self.fn(objs)
+
+
+def batch(fn):
+    """Field helper for serialize.
+
+    Wraps a function taking a list of objects and returning a mapping of
+    objects to values, for use as a `(key, batch(fn))` attribute
+    description. The function is called once for every list (or chunk) of
+    objects being serialized, instead of once per object, so the values
+    can be computed with a single query. Objects missing from the mapping
+    get `None`.
+    """
+    return BatchField(fn)
 
 
 def flatten(attname):
@@ -1,9 +1,14 @@
+import calendar
+import datetime
+
 from django.conf import settings
 from django.contrib import auth
 from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import PermissionDenied
 from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date, parse_http_date_safe
 from django.utils.translation import ugettext as _
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
@@ -11,7 +16,8 @@ from django.views.generic import View
 from . import exceptions, http
 from .auth import SessionAuth, TokenAuth
 from .compat import get_user_model
-from .parsers import parse_content_type
+from .mediatypes import lookup, parse_media_type
+from .renderers import select_renderer
 from .settings import api_settings
 from .utils import serialize
 
@@ -19,6 +25,88 @@ __all__ = ['Endpoint', 'SessionAuthEndpoint', 'TokenAuthEndpoint']
 
 from pprint import pprint as pp
 
+try:
+    from hashlib import blake2b
+
+    def _etag_hash(data):
+        return blake2b(data, digest_size=16)
+except ImportError:
+    # Python < 3.6
+    from hashlib import md5 as _etag_hash
+
+
+def quote_etag(etag):
+    if etag.startswith(('"', 'W/"')):
+        return etag
+    return '"%s"' % etag
+
+
+def etag_matches(header, etag):
+    """
+    Check if `etag` is one of the entity tags in the If-None-Match `header`,
+    using the weak comparison function.
+    """
+    if header.strip() == '*':
+        return True
+    etag = etag[2:] if etag.startswith('W/') else etag
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class _LazyRequestAttribute(object):
+    """A request attribute computed by `load(request)` on first access."""
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+
+    def __get__(self, request, owner):
+        if request is None:
+            return self
+        try:
+            return request.__dict__[self.name]
+        except KeyError:
+            value = request.__dict__[self.name] = self.load(request)
+            return value
+
+    def __set__(self, request, value):
+        request.__dict__[self.name] = value
+
+
+_lazy_request_classes = {}
+
+
+def _lazy_request_class(cls):
+    """Return a subclass of the request class `cls` with the lazy attributes."""
+    try:
+        return _lazy_request_classes[cls]
+    except KeyError:
+        pass
+    if getattr(cls, '_resticus_lazy', False):
+        return cls
+    lazy = type(cls.__name__, (cls,), {
+        '_resticus_lazy': True,
+        'params': _LazyRequestAttribute('params',
+            lambda request: dict(request.GET.items())),
+        'raw_data': _LazyRequestAttribute('raw_data',
+            lambda request: request.body),
+        'data': _LazyRequestAttribute('data',
+            lambda request: request._parse_body(request)),
+    })
+    return _lazy_request_classes.setdefault(cls, lazy)
+
+
+def _timestamp(value):
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return calendar.timegm(value.utctimetuple())
+
+
 class Endpoint(View):
     """
     Class-based Django view that should be extended to provide an API
@@ -39,11 +127,17 @@ class Endpoint(View):
           either form submission or submitted application/json data payload
       * request.raw_data - string containing raw request body
 
+    The `params`, `data` and `raw_data` attributes are computed on first
+    access, so the body isn't read or parsed unless it's used. A
+    :py:class:`resticus.exceptions.ParseError` raised while parsing
+    `request.data` in the view method results in a 400 response.
+
     The view method should return either a HTTPResponse (for example, a
     redirect), or something else (usually a dictionary or a list). If something
     other than HTTPResponse is returned, it is first serialized into
     :py:class:`resticus.http.JSONResponse` with a status code 200 (OK),
-    then returned.
+    then returned. The data is rendered with the one of `renderer_classes`
+    that best matches the request's Accept header, JSON by default.
 
     The authenticate method should return either a HttpResponse, which will
     shortcut the rest of the request handling (the view method will not be
@@ -52,28 +146,54 @@ class Endpoint(View):
     Both methods can raise a :py:class:`resticus.http.HttpError` exception
     instead of returning a HttpResponse, to shortcut the request handling and
     immediately return the error to the client.
+
+    Unless `use_etags` is false, successful GET and HEAD responses get a
+    strong ETag computed from the body, and a 304 Not Modified response is
+    sent instead if it matches the request's If-None-Match header. To avoid
+    producing the body at all, implement `get_etag()` to return a cheaply
+    computed ETag for the resource. Likewise, if `get_last_modified()`
+    returns the modification time of the resource, responses get a
+    Last-Modified header, and requests with a not older If-Modified-Since
+    header get a 304 response without calling the view method.
+
+    Unless `compression` is false, responses are compressed with the coding
+    negotiated from the Accept-Encoding header, see
+    :py:func:`resticus.http.compress_response`.
     """
 
     authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
     login_required = api_settings.LOGIN_REQUIRED
     permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
     data_parsers = api_settings.DATA_PARSERS
+    renderer_classes = api_settings.RENDERERS
+    use_etags = api_settings.USE_ETAGS
+    compression = api_settings.COMPRESSION
 
     def parse_body(self, request):
         if request.method not in ['POST', 'PUT', 'PATCH']:
             return
 
-        content_type, params = parse_content_type(request.content_type)
+        media_type = parse_media_type(request.content_type)
+        if media_type is None:
+            raise exceptions.ParseError()
 
-        try:
-            parser = self.data_parsers[content_type]
-        except KeyError:
+        # Also finds eg. the JSON parser for application/vnd.api+json
+        parser = lookup(media_type, self.data_parsers)
+        if parser is None:
             raise exceptions.ParseError()
 
-        return parser(request, **params)
+        return parser(request, **media_type.params)
 
     def authenticate(self, request):
         request.authenticator = None
+        # Sub-requests of a batch reuse the batch request's authentication,
+        # if it was done with a method this endpoint accepts
+        user, authenticator = getattr(request, 'outer_auth', (None, None))
+        if authenticator is not None and \
+                authenticator.__class__ in self.authentication_classes:
+            request.authenticator = authenticator
+            return user
+
         for authenticator in self.get_authenticators():
             user = authenticator.authenticate(request)
             if user and user.is_authenticated():
@@ -135,21 +255,88 @@ class Endpoint(View):
             raise exceptions.NotAuthenticated()
         raise exceptions.PermissionDenied()
 
+    def get_etag(self, request, *args, **kwargs):
+        """
+        Return the ETag of the resource, or None to compute it from the
+        response body. Called before the view method, with the same
+        arguments, for GET and HEAD requests.
+        """
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        """
+        Return the modification time (a datetime) of the resource, or None
+        if it isn't known. Called before the view method, with the same
+        arguments, for GET and HEAD requests.
+        """
+        return None
+
+    def check_preconditions(self, request, *args, **kwargs):
+        """
+        Return a 304 response if the resource wasn't modified according to
+        the conditional request headers, or None otherwise.
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if self.use_etags:
+            etag = self.get_etag(request, *args, **kwargs)
+            if etag is not None:
+                request.etag = etag = quote_etag(etag)
+                if if_none_match and etag_matches(if_none_match, etag):
+                    return http.Http304(etag=etag)
+
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            if_modified_since = parse_http_date_safe(if_modified_since)
+        last_modified = self.get_last_modified(request, *args, **kwargs)
+        if last_modified is not None:
+            request.last_modified = last_modified = _timestamp(last_modified)
+            # If-None-Match takes precedence over If-Modified-Since
+            if if_modified_since is not None and not if_none_match and \
+                    last_modified <= if_modified_since:
+                return http.Http304()
+        return None
+
+    def set_etag(self, request, response):
+        """
+        Set the ETag header on a successful `response`, and return a 304
+        response instead if it matches the If-None-Match header.
+        """
+        if response.status_code != 200 or response.streaming or \
+                response.has_header('ETag'):
+            return response
+
+        etag = getattr(request, 'etag', None)
+        if etag is None:
+            etag = '"%s"' % _etag_hash(response.content).hexdigest()
+        response['ETag'] = etag
+
+        header = request.META.get('HTTP_IF_NONE_MATCH')
+        if header and etag_matches(header, etag):
+            not_modified = http.Http304(etag=etag)
+            for name in ('Cache-Control', 'Expires', 'Vary',
+                    'Content-Location'):
+                if response.has_header(name):
+                    not_modified[name] = response[name]
+            return not_modified
+        return response
+
     def http_method_not_allowed(self, request, *args, **kwargs):
         return http.Http405(request.method, permitted_methods=self._allowed_methods())
 
     @method_decorator(csrf_exempt)
     def dispatch(self, request, *args, **kwargs):
+        request.__class__ = _lazy_request_class(request.__class__)
         request.content_type = request.META.get('CONTENT_TYPE', 'text/plain')
-        request.params = dict((k, v) for (k, v) in request.GET.items())
-        request.data = None
-        request.raw_data = request.body
+        request._parse_body = self.parse_body
 
         try:
             request.user = self.authenticate(request)
             self.check_permissions(request)
-            request.data = self.parse_body(request)
-            response = super(Endpoint, self).dispatch(request, *args, **kwargs)
+            response = None
+            if request.method in ('GET', 'HEAD'):
+                response = self.check_preconditions(request, *args, **kwargs)
+            if response is None:
+                response = super(Endpoint, self).dispatch(request, *args, **kwargs)
 
         except exceptions.AuthenticationFailed as err:
             response = self.authentication_failed(err)
@@ -161,9 +348,41 @@ class Endpoint(View):
             response = self.server_error(err)
 
         if not isinstance(response, (HttpResponse, StreamingHttpResponse)):
-            response = http.Http200(response)
+            response = self.render(request, response)
+        if response.status_code in (200, 304):
+            # 304s from check_preconditions() too, so caches revalidate
+            # the right representation
+            vary = self.get_vary_headers(request)
+            if vary:
+                patch_vary_headers(response, vary)
+        if request.method in ('GET', 'HEAD'):
+            if self.use_etags:
+                response = self.set_etag(request, response)
+            last_modified = getattr(request, 'last_modified', None)
+            if last_modified is not None and \
+                    response.status_code in (200, 304) and \
+                    not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(last_modified)
+        if self.compression:
+            response = http.compress_response(request, response)
         return response
 
+    def render(self, request, data):
+        """Render `data` in a 200 response, in the negotiated format."""
+        renderer = select_renderer(request.META.get('HTTP_ACCEPT'),
+            self.renderer_classes)
+        return http.Http200(data, renderer=renderer())
+
+    def get_vary_headers(self, request):
+        """
+        The request headers the representation depends on, set in the Vary
+        header of successful and 304 responses. Accept-Encoding is added
+        by the compression.
+        """
+        if len(self.renderer_classes) > 1:
+            return ['Accept']
+        return []
+
     def authentication_failed(self, err):
         # WWW-Authenticate header for 401 responses, else coerce to 403
         auth_header = self.get_authenticate_header(self.request)
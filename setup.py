@@ -26,7 +26,7 @@ setup(
         "Programming Language :: Python :: 3",
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
-    packages=find_packages(exclude=['tests', 'tests.*']),
+    packages=find_packages(exclude=['tests', 'tests.*', 'benchmarks']),
     install_requires=[
         'Django>=1.6',
         'django-filter>=0.12.0',
@@ -0,0 +1,174 @@
+import base64
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from django.db import close_old_connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from resticus import batch
+from resticus.compat import json, get_user_model
+from .client import TestClient
+from .testapp.models import Author
+from .testapp.views import VersionedView
+
+
+class BatchTests(TestCase):
+    url_name = 'batch_view'
+
+    def setUp(self):
+        self.client = TestClient()
+        self.author = Author.objects.create(name='User Foo')
+
+    def batch(self, items, **extra):
+        return self.client.post(self.url_name, data=json.dumps(items),
+            content_type='application/json', extra=extra)
+
+    def test_batch(self):
+        r = self.batch([
+            {'method': 'GET', 'path': '/authors/'},
+            {'method': 'POST', 'path': '/authors/',
+                'body': {'name': 'User Bar'}},
+            {'path': '/authors/%d' % self.author.id},
+        ])
+        self.assertEqual(r.status_code, 200)
+        results = r.json['data']
+        self.assertEqual([result['status'] for result in results],
+            [200, 201, 200])
+        self.assertEqual(len(results[0]['body']['data']), 1)
+        self.assertEqual(results[1]['body']['data']['name'], 'User Bar')
+        self.assertEqual(results[2]['body']['data']['name'], 'User Foo')
+        self.assertTrue(results[0]['headers']['Content-Type'].startswith(
+            'application/json'))
+        self.assertEqual(Author.objects.count(), 2)
+
+    def test_errors_are_reported_per_request(self):
+        r = self.batch([
+            {'method': 'GET', 'path': '/authors/999'},
+            {'method': 'DELETE', 'path': '/versioned-view/'},
+            {'method': 'POST', 'path': '/authors/', 'body': '{'},
+            {'method': 'GET', 'path': '/no-such-view/'},
+        ])
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual([result['status'] for result in r.json['data']],
+            [404, 405, 400, 404])
+
+    def test_headers_and_query_string(self):
+        r = self.batch([
+            {'method': 'GET', 'path': '/echo-view/?a=1',
+                'headers': {'X-Foo': 'bar'}},
+        ], HTTP_X_OUTER='outer', HTTP_ACCEPT_ENCODING='gzip')
+        result = r.json['data'][0]
+        headers = result['body']['headers']
+        self.assertEqual(headers['QUERY_STRING'], 'a=1')
+        self.assertEqual(headers['HTTP_X_FOO'], 'bar')
+        self.assertNotIn('HTTP_X_OUTER', headers)
+        self.assertNotIn('HTTP_ACCEPT_ENCODING', headers)
+        self.assertNotIn('Content-Encoding', result['headers'])
+
+    @override_settings(RESTICUS={'COMPRESSION_MIN_SIZE': 0})
+    def test_sub_responses_arent_compressed(self):
+        for i in range(20):
+            Author.objects.create(name='Author %d' % i)
+        r = self.batch([{'path': '/authors/',
+            'headers': {'Accept-Encoding': 'gzip'}}])
+        result = r.json['data'][0]
+        self.assertNotIn('Content-Encoding', result['headers'])
+        self.assertEqual(len(result['body']['data']), 21)
+
+    def test_authentication(self):
+        get_user_model().objects.create_user(username='foo', password='bar')
+        self.client.login(username='foo', password='bar')
+        basic = 'Basic ' + base64.b64encode(b'foo:bar').decode('ascii')
+
+        r = self.batch([
+            {'path': '/auth/'},
+            {'path': '/auth/basic/'},
+            {'path': '/auth/basic/', 'headers': {'Authorization': basic}},
+        ])
+        results = r.json['data']
+        # Session auth is reused, but not for endpoints not accepting it
+        self.assertEqual(results[0]['status'], 200)
+        self.assertEqual(results[0]['body']['data']['username'], 'foo')
+        self.assertEqual(results[1]['status'], 401)
+        self.assertEqual(results[2]['status'], 200)
+        self.assertEqual(results[2]['body']['username'], 'foo')
+
+    def test_cookies(self):
+        r = self.batch([{'method': 'POST', 'path': '/cookie-view/'}])
+        self.assertEqual(sorted(r.json['data'][0]['headers']['Set-Cookie']),
+            ['flavour=oat; Path=/', 'size=large; HttpOnly; Path=/'])
+        self.assertNotIn('flavour', r.cookies)
+
+    def test_empty_body(self):
+        r = self.batch([{'method': 'HEAD', 'path': '/versioned-view/'}])
+        self.assertEqual(r.json['data'][0]['status'], 200)
+        self.assertIsNone(r.json['data'][0]['body'])
+
+    def test_nested_batch_is_rejected(self):
+        r = self.batch([{'method': 'POST', 'path': '/batch/', 'body': []}])
+        self.assertEqual(r.json['data'][0]['status'], 400)
+
+    def test_invalid_batch(self):
+        for items in ({'path': '/authors/'}, [{'method': 'GET'}],
+                [{'path': 'authors/'}], ['/authors/']):
+            r = self.batch(items)
+            self.assertEqual(r.status_code, 400)
+
+    def test_max_requests(self):
+        r = self.batch([{'path': '/versioned-view/'}] * 6)
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(Author.objects.count(), 1)
+
+
+class ThreadedBatchTests(TransactionTestCase):
+    def setUp(self):
+        self.client = TestClient()
+
+    def batch(self, items):
+        return self.client.post('threaded_batch_view', data=json.dumps(items),
+            content_type='application/json')
+
+    def test_threaded_batch_with_database(self):
+        Author.objects.create(name='User Foo')
+        items = [{'method': 'POST', 'path': '/authors/',
+            'body': {'name': 'User Bar'}}] + [{'path': '/authors/'}] * 2
+        with mock.patch.object(batch, 'close_old_connections',
+                wraps=close_old_connections) as close:
+            r = self.batch(items)
+        # Before and after each threaded sub-request
+        self.assertEqual(close.call_count, 4)
+        results = r.json['data']
+        self.assertEqual([result['status'] for result in results],
+            [201, 200, 200])
+        self.assertEqual(len(results[1]['body']['data']), 2)
+        self.assertEqual(results[2]['body'], results[1]['body'])
+
+    def test_threaded_batch(self):
+        calls = VersionedView.calls
+        items = [{'path': '/versioned-view/'}] * 3 + [
+            {'method': 'POST', 'path': '/echo-view/', 'body': 'xyz'},
+            {'path': '/echo-view/'},
+        ]
+        r = self.batch(items)
+        self.assertEqual(r.status_code, 200)
+        results = r.json['data']
+        self.assertEqual([result['status'] for result in results], [200] * 5)
+        self.assertEqual(results[0]['body'], {'version': 'v1'})
+        self.assertEqual(results[3]['body']['raw_data'], 'eHl6')
+        self.assertEqual(VersionedView.calls, calls + 3)
+
+
+class AtomicBatchTests(TestCase):
+    def test_threads_arent_used_in_transactions(self):
+        """Test that sub-requests see earlier changes of the batch"""
+
+        items = [{'method': 'POST', 'path': '/authors/',
+            'body': {'name': 'User Bar'}}] + [{'path': '/authors/'}] * 2
+        with mock.patch.object(batch, 'close_old_connections') as close:
+            r = TestClient().post('threaded_batch_view',
+                data=json.dumps(items), content_type='application/json')
+        self.assertFalse(close.called)
+        results = r.json['data']
+        self.assertEqual(results[1]['body']['data'][0]['name'], 'User Bar')
+        self.assertEqual(results[2]['body'], results[1]['body'])
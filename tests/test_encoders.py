@@ -1,9 +1,15 @@
+import datetime
 import sys
+from decimal import Decimal
 
 import pytest
-from django.test import TestCase
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, override_settings
+from django.utils.timezone import utc
+from django.utils.translation import ugettext_lazy
 
 from resticus import encoders
+from resticus.compat import json
 from resticus.settings import api_settings
 
 try:
@@ -12,6 +18,30 @@ try:
 except ImportError:
     RAPIDJSON_INSTALLED = False
 
+try:
+    import orjson
+    ORJSON_INSTALLED = True
+except ImportError:
+    ORJSON_INSTALLED = False
+
+
+BACKENDS = [(encoders.JSONEncoder, encoders.JSONDecoder)]
+if RAPIDJSON_INSTALLED:
+    BACKENDS.append((encoders.RapidJSONEncoder, encoders.RapidJSONDecoder))
+if ORJSON_INSTALLED:
+    BACKENDS.append((encoders.OrJSONEncoder, encoders.OrJSONDecoder))
+
+
+class TextDecoder(object):
+    def decode(self, data):
+        assert isinstance(data, type(u''))
+        return json.loads(data)
+
+
+class TextEncoder(object):
+    def encode(self, data):
+        return u'"\u00e9t\u00e9"'
+
 
 class JSONEncoderTests(TestCase):
     @pytest.mark.skipif(RAPIDJSON_INSTALLED, reason='not used if rapidjson is present')
@@ -23,3 +53,83 @@ class JSONEncoderTests(TestCase):
     def test_using_rapidjson(self):
         assert api_settings.JSON_DECODER == encoders.RapidJSONDecoder
         assert api_settings.JSON_ENCODER == encoders.RapidJSONEncoder
+
+    def test_shared_instances(self):
+        encoder = encoders.get_encoder()
+        assert isinstance(encoder, api_settings.JSON_ENCODER)
+        assert encoders.get_encoder() is encoder
+        assert encoders.get_decoder() is encoders.get_decoder()
+
+        with override_settings(RESTICUS={
+                'JSON_ENCODER': 'tests.test_encoders.TextEncoder'}):
+            assert isinstance(encoders.get_encoder(), TextEncoder)
+            assert encoders.encode_json({}) == u'"\u00e9t\u00e9"'.encode('utf-8')
+        assert encoders.get_encoder() is encoder
+
+    def test_encode_json(self):
+        data = encoders.encode_json({'a': [1, u'\u00e9']})
+        assert isinstance(data, bytes)
+        assert encoders.decode_json(data.decode('utf-8')) == {'a': [1, u'\u00e9']}
+
+    def test_dates(self):
+        """Dates and datetimes encode like with DjangoJSONEncoder"""
+
+        encoder = encoders.JSONEncoder()
+        for value in [
+                datetime.datetime(2020, 1, 2, 3, 4, 5),
+                datetime.datetime(2020, 1, 2, 3, 4, 5, 678901),
+                datetime.datetime(2020, 1, 2, 3, 4, 5, 678901, tzinfo=utc),
+                datetime.date(2020, 1, 2)]:
+            assert encoder.default(value) == DjangoJSONEncoder().default(value)
+
+    @pytest.mark.skipif(not ORJSON_INSTALLED, reason='Requires orjson')
+    def test_orjson(self):
+        data = {
+            'decimal': Decimal('1.10'),
+            'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5, 678901),
+            'lazy': ugettext_lazy('Lazy'),
+            'items': (i for i in range(3)),
+        }
+        encoder = encoders.get_encoder(encoders.OrJSONEncoder)
+        expected = encoders.JSONEncoder(separators=(',', ':')).encode(
+            dict(data, items=[0, 1, 2]))
+        assert encoder.encode_bytes(data) == expected.encode('utf-8')
+
+    def test_conformance(self):
+        """Every backend round-trips the types they all agree on"""
+
+        data = {'items': [{'id': i, 'name': u'\u00e9t\u00e9 %d' % i,
+            'ratio': i / 4.0, 'flags': [True, None, [i]],
+            'lazy': ugettext_lazy('Lazy')} for i in range(3)]}
+        text = encoders.JSONEncoder().encode(data)
+        expected = json.loads(text)
+        for encoder_class, decoder_class in BACKENDS:
+            encoded = encoders.encode_json(data, encoder_class())
+            assert json.loads(encoded.decode('utf-8')) == expected, encoder_class
+            assert decoder_class().decode(text) == expected, decoder_class
+
+    def test_raw_json(self):
+        raw = encoders.RawJSON(u'{"cached": [1, "\u00e9"]}')
+        data = {'data': [raw, {'nested': raw}], 'other': ugettext_lazy('x')}
+        for encoder_class, _ in BACKENDS:
+            encoder = encoder_class()
+            encoded = encoders.encode_json(data, encoder)
+            assert raw.data in encoded, encoder_class
+            assert json.loads(encoded.decode('utf-8')) == {
+                'data': [{'cached': [1, u'\u00e9']},
+                         {'nested': {'cached': [1, u'\u00e9']}}],
+                'other': 'x'}
+            assert encoder.encode(raw) == raw.data.decode('utf-8')
+
+        # Encoding without encode() falls back to decoding the fragment
+        assert ''.join(encoders.JSONEncoder().iterencode([raw])) == \
+            '[{"cached": [1, "\\u00e9"]}]'
+
+    def test_decode_bytes(self):
+        text = u'{"a": ["\u00e9t\u00e9", 1.5]}'
+        data = text.encode('utf-8')
+        for decoder_class in [decoder for _, decoder in BACKENDS] + [TextDecoder]:
+            decoder = decoder_class()
+            for value in (data, bytearray(data), memoryview(data), text):
+                assert encoders.decode_json(value, decoder) == \
+                    {'a': [u'\u00e9t\u00e9', 1.5]}, (decoder_class, value)
@@ -1,6 +1,8 @@
 import base64
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 from resticus.compat import json
+from resticus.exceptions import ParseError
+from resticus.views import Endpoint
 from .client import TestClient, debug
 from .testapp.models import Publisher, Author, Book
 
@@ -125,3 +127,73 @@ class TestEndpoint(TestCase):
     def test_raising_http_error_returns_it(self):
         r = self.client.get('error_raising_view')
         self.assertEqual(r.status_code, 400)
+
+    def test_etag(self):
+        """Exercise conditional GET requests with computed ETags"""
+
+        r = self.client.get('author_detail', author_id=self.author.id)
+        etag = r['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        r = self.client.get('author_detail', author_id=self.author.id,
+            extra={'HTTP_IF_NONE_MATCH': '"other", ' + etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.content, b'')
+        self.assertEqual(r['ETag'], etag)
+
+        r = self.client.get('author_detail', author_id=self.author.id,
+            extra={'HTTP_IF_NONE_MATCH': 'W/' + etag})
+        self.assertEqual(r.status_code, 304)
+
+        Author.objects.filter(id=self.author.id).update(name='User Bar')
+        r = self.client.get('author_detail', author_id=self.author.id,
+            extra={'HTTP_IF_NONE_MATCH': etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r['ETag'], etag)
+
+        # Only successful responses get ETags
+        r = self.client.get('error_raising_view')
+        self.assertFalse(r.has_header('ETag'))
+
+    def test_precomputed_etag(self):
+        """Exercise skipping the view method with a precomputed ETag"""
+
+        from .testapp.views import VersionedView
+        calls = VersionedView.calls
+
+        r = self.client.get('versioned_view')
+        self.assertEqual(r['ETag'], '"v1"')
+        self.assertEqual(r.json, {'version': 'v1'})
+
+        vary = r.get('Vary')
+
+        r = self.client.get('versioned_view',
+            extra={'HTTP_IF_NONE_MATCH': '"v1"'})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(VersionedView.calls, calls + 1)
+        self.assertEqual(r.get('Vary'), vary)
+
+    def test_lazy_body(self):
+        """Test that the body is only read and parsed when used"""
+
+        # The view doesn't look at request.data, so the body isn't parsed
+        r = self.client.post('echo_view', data='xyz',
+            content_type='application/json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(base64.b64decode(r.json['raw_data'].encode('ascii')),
+            b'xyz')
+
+        class View(Endpoint):
+            def post(self, request):
+                return {'params': request.params}
+
+        request = RequestFactory().post('/?a=1', data='xyz',
+            content_type='application/json')
+        r = View.as_view()(request)
+        self.assertEqual(json.loads(r.content.decode('utf-8')),
+            {'params': {'a': '1'}})
+        self.assertNotIn('raw_data', request.__dict__)
+        self.assertNotIn('data', request.__dict__)
+        with self.assertRaises(ParseError):
+            request.data
+        self.assertEqual(request.raw_data, b'xyz')
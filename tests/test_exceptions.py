@@ -0,0 +1,80 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from django.test import TestCase, override_settings
+
+from resticus.compat import json
+
+from resticus import exceptions, http
+
+
+class CountingResponse(http.Http404):
+    created = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingResponse.created += 1
+        super(CountingResponse, self).__init__(*args, **kwargs)
+
+
+class Gone(exceptions.APIException):
+    response_class = CountingResponse
+    default_reason = 'Gone'
+
+
+class APIExceptionTests(TestCase):
+    def test_lazy_response(self):
+        created = CountingResponse.created
+        try:
+            raise Gone()
+        except Gone as err:
+            exc = err
+        self.assertEqual(CountingResponse.created, created)
+
+        response = exc.response
+        self.assertIs(exc.response, response)
+        self.assertEqual(CountingResponse.created, created + 1)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn(b'"Gone"', response.content)
+
+        exc.response = http.Http409('Conflict')
+        self.assertEqual(exc.response.status_code, 409)
+
+    def test_http_error(self):
+        err = exceptions.HttpError(418, 'Teapot')
+        self.assertEqual(err.response.status_code, 418)
+        self.assertIn(b'"Teapot"', err.response.content)
+
+        self.assertEqual(exceptions.HttpError().response.status_code, 500)
+
+    def test_validation_error_details(self):
+        class Form(object):
+            errors = {'name': ['Required']}
+
+        err = exceptions.ValidationError(Form())
+        self.assertEqual(err.response.status_code, 400)
+        self.assertIn(b'"Required"', err.response.content)
+
+    @override_settings(DEBUG=True)
+    def test_debug_traceback(self):
+        """Test that only errors raised while handling others get a traceback"""
+
+        try:
+            raise exceptions.HttpError(400, 'Bad')
+        except exceptions.HttpError as err:
+            data = json.loads(err.response.content.decode('utf-8'))
+        self.assertEqual(data, {'errors': [{'detail': 'Bad'}]})
+
+        with mock.patch.object(http.traceback, 'format_exception',
+                wraps=http.traceback.format_exception) as format_exception:
+            try:
+                try:
+                    raise KeyError('missing')
+                except KeyError:
+                    raise exceptions.NotFound('Not here')
+            except exceptions.NotFound as err:
+                exc = err
+            # Formatted when the response is built
+            self.assertFalse(format_exception.called)
+            data = json.loads(exc.response.content.decode('utf-8'))
+            self.assertIn('missing', data['errors'][0]['meta']['traceback'])
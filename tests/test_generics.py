@@ -1,10 +1,19 @@
+import calendar
 from decimal import Decimal
-from django.test import TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
 
+from resticus import generics
 from resticus.compat import json
+from resticus.http import JSONResponse
+from resticus.permissions import BasePermission
+from resticus.utils import serialize
 
 from .client import TestClient, debug
 from .testapp.models import Publisher, Author, Book
+from .testapp.views import BookList, PublisherDetail
 
 
 class TestModelViews(TestCase):
@@ -73,3 +82,237 @@ class TestModelViews(TestCase):
         r = self.client.get('book_detail', isbn=self.book.isbn)
         self.assertEqual(r.status_code, 200)
         self.assertEqual(r.json['data']['id'], self.book.id)
+
+    def test_book_list_from_values(self):
+        """Excercise the values() fast path of ListEndpoint"""
+
+        self.author.books.create(author=self.author, title='Book 2',
+            isbn='5678', price=Decimal('12.50'), publisher=self.publisher)
+        with self.assertNumQueries(1):
+            r = self.client.get('book_list')
+        self.assertEqual(r.status_code, 200)
+        expected = JSONResponse({'data': serialize(list(Book.objects.all()),
+            fields=BookList.fields)}).content
+        self.assertEqual(r.content, expected)
+
+    def test_nested_list_query_count(self):
+        """Excercise select/prefetch of related objects named in fields"""
+
+        for i in range(10):
+            author = Author.objects.create(name='Author %d' % i)
+            for j in range(3):
+                author.books.create(title='Book %d' % j, isbn='%d-%d' % (i, j),
+                    price=Decimal('1.0'), publisher=self.publisher)
+
+        with self.assertNumQueries(2):
+            r = self.client.get('author_book_list')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json['data']), 11)
+        self.assertEqual(r.json['data'][1]['books'][0],
+            {'title': 'Book 0', 'isbn': '0-0', 'publisher': {'name': 'User Foo'}})
+
+    def test_streaming_list(self):
+        """Excercise the streaming mode of ListEndpoint"""
+
+        for i in range(4):
+            author = Author.objects.create(name='Author %d' % i)
+            author.books.create(title='Book', isbn='%d' % i,
+                price=Decimal('1.0'), publisher=self.publisher)
+
+        expected = self.client.get('author_book_list').content
+        r = self.client.get('streaming_author_book_list')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        self.assertEqual(b''.join(r.streaming_content), expected)
+
+    def test_streaming_list_empty(self):
+        Author.objects.all().delete()
+        r = self.client.get('streaming_author_book_list')
+        self.assertEqual(json.loads(b''.join(r.streaming_content).decode('utf-8')),
+            {'data': []})
+
+    def test_columnar_list(self):
+        """Excercise the columnar shape of ListEndpoint"""
+
+        columns = list(BookList.fields)
+        r = self.client.get('book_list', data={'shape': 'columnar'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json['data']['columns'], columns)
+        self.assertEqual(r.json['data']['rows'],
+            [[self.book.id, 'Book', '1234', self.author.id, self.publisher.id,
+              '10.00']])
+
+        r = self.client.get('book_list', extra={
+            'HTTP_ACCEPT': 'application/json; shape=columnar'})
+        self.assertEqual(r.json['data']['columns'], columns)
+
+        self.assertIn('Accept', r['Vary'])
+
+        r = self.client.get('book_list', data={'shape': 'objects'}, extra={
+            'HTTP_ACCEPT': 'application/json; shape=columnar'})
+        self.assertEqual(r.json['data'][0]['id'], self.book.id)
+
+        r = self.client.get('book_list')
+        self.assertIn('Accept', r['Vary'])
+        r = self.client.get('streaming_author_book_list')
+        self.assertIn('Accept', r['Vary'])
+
+        r = self.client.get('book_list', data={'shape': 'rows'})
+        self.assertEqual(r.status_code, 400)
+        r = self.client.get('book_list', extra={
+            'HTTP_ACCEPT': 'application/json; shape=rows'})
+        self.assertEqual(r.status_code, 400)
+
+    def test_overridden_serialize(self):
+        """Test that lists use a per-object serialize() override"""
+
+        class AuthorList(generics.ListEndpoint):
+            model = Author
+            fields = ['id', 'name']
+
+            def serialize(self, obj):
+                data = super(AuthorList, self).serialize(obj)
+                data['upper'] = obj.name.upper()
+                return data
+
+        factory = RequestFactory()
+        expected = [{'id': self.author.id, 'name': 'User Foo',
+            'upper': 'USER FOO'}]
+        r = AuthorList.as_view()(factory.get('/'))
+        self.assertEqual(json.loads(r.content.decode('utf-8'))['data'],
+            expected)
+
+        r = AuthorList.as_view()(factory.get('/', {'shape': 'columnar'}))
+        self.assertEqual(json.loads(r.content.decode('utf-8'))['data'],
+            {'columns': ['id', 'name', 'upper'],
+             'rows': [[self.author.id, 'User Foo', 'USER FOO']]})
+
+        # Streaming needs the columns in advance
+        r = AuthorList.as_view(streaming=True)(
+            factory.get('/', {'shape': 'columnar'}))
+        self.assertEqual(r.status_code, 406)
+        r = AuthorList.as_view(streaming=True)(factory.get('/',
+            HTTP_ACCEPT='application/json; shape=columnar'))
+        self.assertEqual(r.status_code, 406)
+
+        # The columnar default falls back to objects
+        r = AuthorList.as_view(streaming=True, columnar=True)(factory.get('/'))
+        content = b''.join(r.streaming_content).decode('utf-8')
+        self.assertEqual(json.loads(content)['data'], expected)
+
+    def test_streaming_columnar_list(self):
+        for i in range(3):
+            Author.objects.create(name='Author %d' % i)
+
+        expected = self.client.get('author_book_list',
+            data={'shape': 'columnar'}).content
+        r = self.client.get('streaming_author_book_list',
+            data={'shape': 'columnar'})
+        self.assertEqual(b''.join(r.streaming_content), expected)
+
+    def test_sparse_fieldset(self):
+        """Excercise narrowing the serialized fields with ?fields="""
+
+        r = self.client.get('author_book_list',
+            data={'fields': 'name,books(isbn),secret'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json['data'], [
+            {'name': 'User Foo', 'books': [{'isbn': '1234'}]}])
+
+        r = self.client.get('book_detail', isbn=self.book.isbn,
+            data={'fields': 'id,price'})
+        self.assertEqual(r.json['data'], {'id': self.book.id, 'price': '10.00'})
+
+        r = self.client.get('book_list', data={'fields': 'id,(title'})
+        self.assertEqual(r.status_code, 400)
+
+    def test_sparse_fieldset_defers_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('author_book_list', data={'fields': 'id,books(isbn)'})
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('"name"', queries[0]['sql'])
+        self.assertNotIn('"title"', queries[1]['sql'])
+
+    def test_overridden_serialize_loads_whole_rows(self):
+        """Columns aren't deferred when serialize() may read any of them"""
+
+        class CustomBookList(BookList):
+            fields = ('id', 'title')
+
+            def serialize(self, obj):
+                return {'id': obj.id, 'isbn': obj.isbn}
+
+        for i in range(5):
+            self.author.books.create(title='Book %d' % i, isbn=str(i),
+                price=Decimal('1.0'), publisher=self.publisher)
+
+        factory = RequestFactory()
+        for params in ({}, {'fields': 'id'}):
+            with self.assertNumQueries(1):
+                r = CustomBookList.as_view()(factory.get('/', params))
+            self.assertEqual(len(json.loads(r.content.decode('utf-8'))['data']), 6)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('author_book_list')
+        self.assertIn('"comment"', queries[0]['sql'])
+
+    def test_last_modified(self):
+        """Exercise If-Modified-Since on list and detail endpoints"""
+
+        modified = self.publisher.modified
+        for name, kwargs in (('publisher_list', {}),
+                ('publisher_detail', {'pk': self.publisher.id})):
+            r = self.client.get(name, **kwargs)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r['Last-Modified'], http_date(
+                calendar.timegm(modified.utctimetuple())))
+            vary = r.get('Vary')
+
+            with CaptureQueriesContext(connection) as queries:
+                r = self.client.get(name, extra={
+                    'HTTP_IF_MODIFIED_SINCE': r['Last-Modified']}, **kwargs)
+            self.assertEqual(r.status_code, 304)
+            self.assertEqual(r.get('Vary'), vary)
+            self.assertEqual(r.content, b'')
+            self.assertEqual(len(queries), 1)
+
+            r = self.client.get(name, extra={'HTTP_IF_MODIFIED_SINCE':
+                http_date(calendar.timegm(modified.utctimetuple()) - 1)},
+                **kwargs)
+            self.assertEqual(r.status_code, 200)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('publisher_detail', pk=self.publisher.id,
+                extra={'HTTP_IF_MODIFIED_SINCE': 'garbage'})
+        self.assertIn('"modified"', queries[0]['sql'])
+        self.assertNotIn('"name"', queries[0]['sql'])
+
+        r = self.client.get('publisher_detail', pk=self.publisher.id + 100,
+            extra={'HTTP_IF_MODIFIED_SINCE': http_date()})
+        self.assertEqual(r.status_code, 404)
+
+    def test_last_modified_checks_object_permissions(self):
+        """Test that a 304 isn't given before object permissions pass"""
+
+        class OwnPublisher(BasePermission):
+            def has_object_permission(self, request, view, obj):
+                return obj.name == request.GET.get('name')
+
+        view = PublisherDetail.as_view(permission_classes=[OwnPublisher])
+        factory = RequestFactory()
+        since = http_date()
+
+        r = view(factory.get('/', HTTP_IF_MODIFIED_SINCE=since),
+            pk=self.publisher.id)
+        self.assertEqual(r.status_code, 401)
+        self.assertFalse(r.has_header('Last-Modified'))
+
+        with self.assertNumQueries(1):
+            r = view(factory.get('/', {'name': 'User Foo'}),
+                pk=self.publisher.id)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.has_header('Last-Modified'))
+
+        r = view(factory.get('/', {'name': 'User Foo'},
+            HTTP_IF_MODIFIED_SINCE=since), pk=self.publisher.id)
+        self.assertEqual(r.status_code, 304)
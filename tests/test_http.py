@@ -0,0 +1,261 @@
+import gzip
+import io
+from decimal import Decimal
+
+import pytest
+from django.http import StreamingHttpResponse
+from django.test import TestCase, RequestFactory, override_settings
+from django.utils import translation
+from django.utils.translation import ugettext_lazy
+
+from resticus import encoders, http
+from resticus.encoders import RawJSON
+from resticus.compat import json
+from .client import TestClient
+from .testapp.models import Author
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.data = {'data': [{'id': i, 'name': 'Author'} for i in range(100)]}
+
+    def request(self, accept_encoding='gzip'):
+        return self.factory.get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_parse_accept_encoding(self):
+        self.assertEqual(http.parse_accept_encoding('gzip, br;q=0.5, *;q=0'),
+            {'gzip': 1.0, 'br': 0.5, '*': 0.0})
+        self.assertEqual(http.parse_accept_encoding('GZIP;q=x, ,'),
+            {'gzip': 0.0})
+
+    def test_negotiation(self):
+        self.assertIs(http.get_compressor(self.request('gzip')),
+            http.GzipCompressor)
+        self.assertIs(http.get_compressor(self.request('gzip;q=0')), None)
+        self.assertIs(http.get_compressor(self.request('identity')), None)
+        self.assertIs(http.get_compressor(self.request('*')),
+            list(http.compressors.values())[0])
+        self.assertIs(http.get_compressor(self.factory.get('/')), None)
+
+    def test_compress_response(self):
+        response = http.JSONResponse(self.data)
+        response['ETag'] = '"abc"'
+        content = response.content
+
+        response = http.compress_response(self.request(), response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gunzip(response.content), content)
+
+    def test_compress_response_skipped(self):
+        small = http.compress_response(self.request(), http.JSONResponse({}))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(small['Vary'], 'Accept-Encoding')
+
+        with override_settings(RESTICUS={'COMPRESSION_MIN_SIZE': 0}):
+            response = http.compress_response(self.request('br;q=0'),
+                http.JSONResponse({}))
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+            # Not worth it
+            response = http.compress_response(self.request(),
+                http.JSONResponse({}))
+            self.assertEqual(response.content, b'{}')
+
+    def test_compression_level(self):
+        content = http.JSONResponse(self.data).content
+        with override_settings(RESTICUS={'COMPRESSION_LEVEL': {'gzip': 1}}):
+            fast = http.compress_response(self.request(),
+                http.JSONResponse(self.data)).content
+        with override_settings(RESTICUS={'COMPRESSION_LEVEL': 9}):
+            best = http.compress_response(self.request(),
+                http.JSONResponse(self.data)).content
+        self.assertEqual(gunzip(fast), content)
+        self.assertEqual(gunzip(best), content)
+        self.assertNotEqual(fast, best)
+
+    def test_compress_streaming_response(self):
+        consumed = []
+
+        def chunks():
+            for i in range(3):
+                consumed.append(i)
+                yield b'[' + str(i).encode('ascii') * 10 + b']'
+
+        response = http.compress_response(self.request(),
+            StreamingHttpResponse(chunks()))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(consumed, [])
+        self.assertEqual(gunzip(b''.join(response.streaming_content)),
+            b'[0000000000][1111111111][2222222222]')
+
+    @pytest.mark.skipif(brotli is None, reason='Requires brotli')
+    def test_brotli(self):
+        response = http.compress_response(self.request('gzip, br'),
+            http.JSONResponse(self.data))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(brotli.decompress(response.content)
+            .decode('utf-8')), self.data)
+
+    @pytest.mark.skipif(zstandard is None, reason='Requires zstandard')
+    def test_zstd(self):
+        response = http.compress_response(self.request('zstd'),
+            StreamingHttpResponse(iter([b'{"data":', b'[1, 2]}'])))
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        content = b''.join(response.streaming_content)
+        decompressed = zstandard.ZstdDecompressor().decompressobj() \
+            .decompress(content)
+        self.assertEqual(decompressed, b'{"data":[1, 2]}')
+
+    def test_endpoint_compression(self):
+        for i in range(50):
+            Author.objects.create(name='Author %d' % i)
+        client = TestClient()
+        r = client.get('author_list', extra={'HTTP_ACCEPT_ENCODING': 'gzip'})
+        self.assertEqual(r['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gunzip(r.content).decode('utf-8'))
+            ['data']), 50)
+
+        r = client.get('author_list')
+        self.assertFalse(r.has_header('Content-Encoding'))
+        self.assertEqual(len(r.json['data']), 50)
+
+
+class StreamingJSONResponseTests(TestCase):
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_encoding(self):
+        data = {
+            'plain': [1, 'two', None, True, 2.5],
+            'nested': {1: [{'a': (i for i in range(3))}], 'b': ()},
+            'items': (dict(id=i, price=Decimal('1.5')) for i in range(5)),
+            'lazy': ugettext_lazy('Lazy'),
+            'raw': RawJSON(b'{"x": 1}'),
+            'empty': iter([]),
+        }
+        expected = {
+            'plain': [1, 'two', None, True, 2.5],
+            'nested': {'1': [{'a': [0, 1, 2]}], 'b': []},
+            'items': [{'id': i, 'price': '1.5'} for i in range(5)],
+            'lazy': 'Lazy',
+            'raw': {'x': 1},
+            'empty': [],
+        }
+        response = http.StreamingJSONResponse(data)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(self.content(response).decode('utf-8')),
+            expected)
+
+        for value in ([], {}, 1, 'x', Decimal('2'), [[1], {}, 2]):
+            self.assertEqual(self.content(http.StreamingJSONResponse(value)),
+                http.JSONResponse(value).content)
+        self.assertEqual(self.content(http.StreamingJSONResponse(
+            i for i in range(3))), b'[0, 1, 2]')
+
+    def test_lazy_chunks(self):
+        produced = []
+
+        def items():
+            for i in range(1000):
+                produced.append(i)
+                yield {'id': i, 'tags': ['a', 'b']}
+
+        response = http.StreamingJSONResponse({'data': items()},
+            chunk_size=1024)
+        self.assertEqual(produced, [])
+        chunks = iter(response.streaming_content)
+        first = next(chunks)
+        self.assertGreaterEqual(len(first), 1024)
+        self.assertLess(len(produced), 100)
+
+        rest = b''.join(chunks)
+        self.assertEqual(len(json.loads((first + rest).decode('utf-8'))
+            ['data']), 1000)
+
+    def test_batches(self):
+        response = http.StreamingJSONResponse(list(range(25)))
+        response.batch_size = 10
+        pieces = list(response.iterencode(list(range(25))))
+        self.assertEqual(len(pieces), 7)
+        self.assertEqual(b''.join(pieces),
+            http.JSONResponse(list(range(25))).content)
+
+    def test_default(self):
+        class Point(object):
+            pass
+
+        class PointEncoder(encoders.JSONEncoder):
+            def default(self, obj):
+                if isinstance(obj, Point):
+                    return (i for i in range(2))
+                return super(PointEncoder, self).default(obj)
+
+        response = http.StreamingJSONResponse({'p': [Point()]},
+            encoder=PointEncoder(separators=(',', ':')))
+        self.assertEqual(self.content(response), b'{"p":[[0,1]]}')
+
+
+class ErrorResponseTests(TestCase):
+    def setUp(self):
+        http._error_cache.clear()
+
+    def test_cached_body(self):
+        r1 = http.Http404('Not here')
+        r2 = http.Http404('Not here')
+        self.assertEqual(r1.status_code, 404)
+        self.assertEqual(json.loads(r2.content.decode('utf-8')),
+            {'errors': [{'detail': 'Not here'}]})
+        self.assertIs(http.error_body(http.Http404, 'Not here'),
+            http.error_body(http.Http404, 'Not here'))
+        self.assertEqual(len(http._error_cache), 1)
+
+        http.Http403('Not here')
+        http.Http400('Not here')
+        self.assertEqual(len(http._error_cache), 3)
+
+    def test_language(self):
+        reason = ugettext_lazy('Not here')
+        with translation.override('en'):
+            http.Http404(reason)
+        with translation.override('fr'):
+            http.Http404(reason)
+        self.assertEqual(len(http._error_cache), 2)
+
+    def test_slow_paths(self):
+        r = http.Http400('Invalid', details={'name': ['Required']})
+        self.assertEqual(json.loads(r.content.decode('utf-8')),
+            {'errors': [{'detail': 'Invalid',
+                         'meta': {'details': {'name': ['Required']}}}]})
+
+        with override_settings(DEBUG=True):
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                r = http.Http500('Failed')
+        self.assertIn('boom', json.loads(r.content.decode('utf-8'))
+            ['errors'][0]['meta']['traceback'])
+        self.assertEqual(len(http._error_cache), 0)
+
+    def test_method_not_allowed_isnt_cached(self):
+        r = http.Http405('BREW', ['GET'])
+        self.assertEqual(json.loads(r.content.decode('utf-8')),
+            {'errors': [{'detail': 'Method "BREW" not allowed'}]})
+        self.assertEqual(len(http._error_cache), 0)
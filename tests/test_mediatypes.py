@@ -0,0 +1,69 @@
+from django.test import TestCase
+
+from resticus import mediatypes
+from resticus.compat import json
+from resticus.mediatypes import MediaType, parse_accept, parse_media_type
+from .client import TestClient
+
+
+class MediaTypeTests(TestCase):
+    def test_parse_media_type(self):
+        media_type = parse_media_type(
+            'Application/Vnd.API+JSON ; Charset="UTF-8"; x="a \\"b\\";c"')
+        self.assertEqual(media_type.media_type, 'application/vnd.api+json')
+        self.assertEqual(media_type.suffix, 'json')
+        self.assertEqual(media_type.params, {'charset': 'utf-8', 'x': 'a "b";c'})
+
+        self.assertIs(parse_media_type('text/plain'),
+            parse_media_type('text/plain'))
+        self.assertEqual(parse_media_type('text/plain').params, {})
+        for value in ('', 'text', 'text/plain junk', '/json'):
+            self.assertIsNone(parse_media_type(value), value)
+
+    def test_parse_accept(self):
+        self.assertEqual(parse_accept(
+            'text/html;q=0.5, application/json; shape=columnar, bogus, */*;q=x'), (
+                MediaType('text', 'html', q=0.5),
+                MediaType('application', 'json', {'shape': 'columnar'}),
+                MediaType('*', '*', q=0.0),
+            ))
+        self.assertEqual(parse_accept(''), ())
+
+    def test_match(self):
+        def match(media_range, media_type):
+            return mediatypes.match(parse_media_type(media_range),
+                parse_media_type(media_type))
+
+        self.assertEqual(match('application/json', 'application/json'), 3)
+        self.assertEqual(match('application/json', 'application/ld+json'), 2)
+        self.assertEqual(match('application/ld+json', 'application/json'), 2)
+        self.assertEqual(match('application/*', 'application/json'), 1)
+        self.assertEqual(match('*/*', 'application/json'), 0)
+        self.assertEqual(match('text/*', 'application/json'), -1)
+        self.assertEqual(match('application/xml', 'application/json'), -1)
+
+    def test_lookup(self):
+        mapping = {'application/json': 1, 'text/*': 2}
+        lookup = lambda value: mediatypes.lookup(parse_media_type(value), mapping)
+        self.assertEqual(lookup('application/json; charset=utf-8'), 1)
+        self.assertEqual(lookup('application/problem+json'), 1)
+        self.assertEqual(lookup('text/csv'), 2)
+        self.assertIsNone(lookup('application/xml'))
+
+    def test_lru_cache(self):
+        cache = mediatypes._LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(list(cache.data), ['a', 'c'])
+
+    def test_endpoint(self):
+        r = TestClient().post('author_list', data=json.dumps({'name': 'Foo'}),
+            content_type='application/vnd.api+json; charset="utf-8"')
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.json['data']['name'], 'Foo')
+
+        r = TestClient().post('author_list', data='{}',
+            content_type='application/xml')
+        self.assertEqual(r.status_code, 400)
@@ -0,0 +1,123 @@
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from django.test import RequestFactory, TestCase, override_settings
+
+from resticus import parsers
+from resticus.compat import json
+from resticus.exceptions import ParseError, RequestEntityTooLarge
+from .client import TestClient
+
+
+class JSONParserTests(TestCase):
+    def request(self, data):
+        if not isinstance(data, bytes):
+            data = json.dumps(data).encode('utf-8')
+        return RequestFactory().post('/', data=data,
+            content_type='application/json')
+
+    def test_parse_json(self):
+        request = self.request({'a': [1, {'b': None}]})
+        self.assertEqual(parsers.parse_json(request), {'a': [1, {'b': None}]})
+
+        with self.assertRaises(ParseError):
+            parsers.parse_json(self.request(b'{"a": '))
+
+    def test_charsets(self):
+        body = u'["\u00e9t\u00e9"]'
+        self.assertEqual(parsers.parse_json(self.request(body.encode('utf-8')),
+            charset='UTF-8'), [u'\u00e9t\u00e9'])
+        self.assertEqual(parsers.parse_json(
+            self.request(body.encode('latin-1')), charset='latin-1'),
+            [u'\u00e9t\u00e9'])
+        with self.assertRaises(ParseError):
+            parsers.parse_json(self.request(b'["\xe9"]'))
+        with self.assertRaises(ParseError):
+            parsers.parse_json(self.request(b'[]'), charset='nope')
+
+    @override_settings(RESTICUS={'JSON_MAX_BYTES': 10})
+    def test_max_bytes(self):
+        request = self.request([1, 2, 3])
+        with mock.patch.object(request, 'read', wraps=request.read) as read:
+            self.assertEqual(parsers.parse_json(request), [1, 2, 3])
+        read.assert_called_once_with(9)
+        self.assertEqual(request.body, b'[1, 2, 3]')
+
+        with self.assertRaises(RequestEntityTooLarge):
+            parsers.parse_json(self.request([1, 2, 3, 4]))
+
+        # Without a Content-Length, the limit is enforced while reading
+        request = self.request([1, 2, 3, 4])
+        del request.META['CONTENT_LENGTH']
+        with self.assertRaises(RequestEntityTooLarge):
+            list(parsers.iter_body(request, 10, chunk_size=4))
+
+    @override_settings(RESTICUS={'JSON_MAX_DEPTH': 2})
+    def test_max_depth(self):
+        self.assertEqual(parsers.parse_json(self.request([[1], '[[['])),
+            [[1], '[[['])
+        with self.assertRaises(ParseError):
+            parsers.parse_json(self.request([[[1]]]))
+        with self.assertRaises(ParseError):
+            parsers.check_depth(u'[{"a": [1]}]', 2)
+        parsers.check_depth(b'[{"a": "[\\"[["}]', 2)
+
+    def test_max_depth_incremental(self):
+        consumed = []
+
+        def chunks():
+            # Strings and escapes spanning chunks
+            for chunk in (b'[{"a": "[\\', b'"[[', b'"}, [[', b'1]]]'):
+                consumed.append(chunk)
+                yield chunk
+
+        self.assertEqual(b''.join(parsers.iter_checked_depth(chunks(), 3)),
+            b'[{"a": "[\\"[["}, [[1]]]')
+        del consumed[:]
+        with self.assertRaises(ParseError):
+            list(parsers.iter_checked_depth(chunks(), 2))
+        self.assertEqual(len(consumed), 3)
+
+        # Deep bodies are rejected before they are read in full
+        with override_settings(RESTICUS={'JSON_MAX_DEPTH': 2}):
+            request = self.request(b'[[[' + b' ' * 200000 + b']]]')
+            with mock.patch.object(request, 'read', wraps=request.read) as read:
+                with self.assertRaises(ParseError):
+                    parsers.parse_json(request)
+            self.assertEqual(read.call_count, 1)
+
+    def test_parse_json_items(self):
+        items = parsers.parse_json_items(self.request(
+            [{'id': i, 'tags': ['a,]', '"']} for i in range(3)]))
+        self.assertEqual(next(items), {'id': 0, 'tags': ['a,]', '"']})
+        self.assertEqual([item['id'] for item in items], [1, 2])
+
+        self.assertEqual(list(parsers.parse_json_items(self.request(b' [] '))), [])
+        for body in (b'', b'{}', b'[1,]', b'[1', b'[1] 2', b'[1}', b'[\xff]'):
+            with self.assertRaises(ParseError):
+                list(parsers.parse_json_items(self.request(body)))
+
+    def test_parse_json_items_limits(self):
+        with override_settings(RESTICUS={'JSON_MAX_DEPTH': 2}):
+            items = parsers.parse_json_items(self.request([[1], [[2]]]))
+            self.assertEqual(next(items), [1])
+            with self.assertRaises(ParseError):
+                next(items)
+
+        with override_settings(RESTICUS={'JSON_MAX_BYTES': 4}):
+            with self.assertRaises(RequestEntityTooLarge):
+                list(parsers.parse_json_items(self.request([1, 2])))
+
+    @override_settings(RESTICUS={'JSON_MAX_BYTES': 20})
+    def test_endpoint(self):
+        client = TestClient()
+        r = client.post('author_list', data=json.dumps({'name': 'x' * 20}),
+            content_type='application/json')
+        self.assertEqual(r.status_code, 413)
+        self.assertEqual(r.json['errors'][0]['detail'],
+            'Request body exceeds 20 bytes.')
+
+        r = client.post('author_list', data=json.dumps({'name': 'x'}),
+            content_type='application/json')
+        self.assertEqual(r.status_code, 201)
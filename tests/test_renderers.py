@@ -0,0 +1,122 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, TestCase
+from django.utils.translation import ugettext_lazy
+
+from resticus import parsers, renderers
+from resticus.compat import json
+from .client import TestClient
+from .testapp.models import Author
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class Renderer(object):
+    def __init__(self, *media_types):
+        self.media_types = media_types
+
+
+class RendererTests(TestCase):
+    def setUp(self):
+        self.client = TestClient()
+        self.json = Renderer('application/json')
+        self.msgpack = Renderer('application/msgpack', 'application/x-msgpack')
+        self.cbor = Renderer('application/cbor')
+        self.renderers = [self.json, self.msgpack, self.cbor]
+
+    def select(self, accept):
+        return renderers.select_renderer(accept, self.renderers)
+
+    def test_select_renderer(self):
+        self.assertIs(self.select(None), self.json)
+        self.assertIs(self.select('*/*'), self.json)
+        self.assertIs(self.select('text/html'), self.json)
+        self.assertIs(self.select('application/cbor'), self.cbor)
+        self.assertIs(self.select('application/x-msgpack'), self.msgpack)
+        self.assertIs(self.select('application/*'), self.json)
+        self.assertIs(self.select(
+            'application/json;q=0.5, application/cbor;q=0.8'), self.cbor)
+        self.assertIs(self.select(
+            'application/json;q=0, */*'), self.msgpack)
+        self.assertIs(self.select(
+            'application/cbor, application/msgpack'), self.cbor)
+        self.assertIs(self.select(
+            'application/json; shape=columnar'), self.json)
+
+    def test_default_json(self):
+        r = self.client.get('author_list', extra={
+            'HTTP_ACCEPT': 'application/xml'})
+        self.assertEqual(r['Content-Type'], 'application/json')
+        self.assertEqual(r.json, {'data': []})
+
+    @pytest.mark.skipif(msgpack is None, reason='Requires msgpack')
+    def test_msgpack(self):
+        data = {
+            'decimal': Decimal('1.10'),
+            'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5, 678901),
+            'lazy': ugettext_lazy('Lazy'),
+            'items': [1, None, [u'\u00e9']],
+        }
+        encoded = renderers.MessagePackRenderer().render(data)
+        self.assertEqual(msgpack.unpackb(encoded, raw=False), json.loads(
+            renderers.JSONRenderer().render(data).decode('utf-8')))
+
+    @pytest.mark.skipif(msgpack is None, reason='Requires msgpack')
+    def test_msgpack_endpoint(self):
+        r = self.client.post('author_list',
+            data=msgpack.packb({'name': 'New User'}, use_bin_type=True),
+            content_type='application/msgpack',
+            extra={'HTTP_ACCEPT': 'application/msgpack'})
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(Author.objects.get().name, 'New User')
+
+        r = self.client.get('author_list',
+            extra={'HTTP_ACCEPT': 'application/msgpack'})
+        self.assertEqual(r['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', r['Vary'])
+        self.assertEqual(msgpack.unpackb(r.content, raw=False)['data'][0]['name'],
+            'New User')
+
+        r = self.client.post('author_list', data=b'\xc1',
+            content_type='application/msgpack')
+        self.assertEqual(r.status_code, 400)
+
+    @pytest.mark.skipif(cbor2 is None, reason='Requires cbor2')
+    def test_cbor(self):
+        data = {
+            'decimal': Decimal('1.10'),
+            'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5),
+            'lazy': ugettext_lazy('Lazy'),
+        }
+        decoded = cbor2.loads(renderers.CBORRenderer().render(data))
+        self.assertEqual(decoded['decimal'], Decimal('1.10'))
+        self.assertEqual(decoded['lazy'], 'Lazy')
+        self.assertEqual(decoded['datetime'].replace(tzinfo=None),
+            data['datetime'])
+
+    def test_missing_library(self):
+        request = RequestFactory().post('/', data=b'\xa0',
+            content_type='application/cbor')
+        for module, name, create in (
+                (renderers, 'msgpack', renderers.MessagePackRenderer),
+                (renderers, 'cbor2', renderers.CBORRenderer),
+                (parsers, 'msgpack', lambda: parsers.parse_msgpack(request)),
+                (parsers, 'cbor2', lambda: parsers.parse_cbor(request))):
+            with mock.patch.object(module, name, None):
+                with self.assertRaises(ImproperlyConfigured):
+                    create()
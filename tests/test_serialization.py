@@ -1,7 +1,25 @@
+import datetime
+import types
 import warnings
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
 from django.test import TestCase
-from resticus.utils import serialize, flatten
+from django.utils.translation import ugettext_lazy
+from resticus import utils
+from resticus.compat import json
+from resticus.encoders import RawJSON
+from resticus.http import JSONResponse
+from resticus.utils import (serialize, serialize_chunks, batch, flatten, get_spec,
+    get_columns, get_field_converter, narrow_fields, optimize_queryset,
+    parse_field_selection, register_serializer)
+from resticus.models import Token
 from .testapp.models import Publisher, Author, Book
 
 
@@ -179,3 +197,382 @@ class TestSerialization(TestCase):
             include=[('desc', accessor)])
 
         self.assertEqual(runs[0], 2)
+
+    def test_plan_is_cached_per_spec(self):
+        """Test that the compiled serialization plan is reused"""
+
+        spec = get_spec(fields=['id', ('books', dict(fields=['title']))])
+        self.assertIs(spec, get_spec(
+            fields=['id', ('books', dict(fields=['title']))]))
+        self.assertIs(spec.plan(Author), spec.plan(Author))
+        self.assertIsNot(spec, get_spec(fields=['id']))
+
+    def test_plan_with_unhashable_spec(self):
+        """Test that unhashable specs are serialized without caching"""
+
+        class Accessor(object):
+            __hash__ = None
+
+            def __call__(self, obj):
+                return obj.name.upper()
+
+        accessor = Accessor()
+        self.assertIsNot(get_spec(include=[('upper', accessor)]),
+            get_spec(include=[('upper', accessor)]))
+        s = serialize(self.author, fields=['id'], include=[('upper', accessor)])
+        self.assertEqual(s, {'id': self.author.id, 'upper': 'USER FOO'})
+
+    def test_serialize_queryset_from_values(self):
+        """Test that flat specs serialize querysets without model instances"""
+
+        expected = serialize(list(Book.objects.all()),
+            fields=['id', 'title', 'author', 'price'])
+
+        with mock.patch.object(Book, 'from_db', side_effect=AssertionError):
+            with self.assertNumQueries(1):
+                s = serialize(Book.objects.all(),
+                    fields=['id', 'title', 'author', 'price'])
+
+        self.assertEqual(s, expected)
+        self.assertEqual(list(s[0].keys()), ['id', 'title', 'author', 'price'])
+
+    def test_serialize_distinct_queryset(self):
+        """Test that distinct querysets keep rows with equal values"""
+
+        Publisher.objects.create(name='Publisher')
+        Publisher.objects.create(name='Publisher')
+        s = serialize(Publisher.objects.distinct(), fields=['name'])
+        self.assertEqual(s, [{'name': 'Publisher'}] * 3)
+
+        s = serialize(Book.objects.order_by('author__name').distinct(),
+            fields=['publisher'])
+        self.assertEqual(len(s), 10)
+        s = serialize(Book.objects.distinct(), fields=['price'], columnar=True)
+        self.assertEqual(len(s['rows']), 10)
+
+    def test_serialize_queryset_with_callable_uses_instances(self):
+        """Test that specs with non-column fields don't use values()"""
+
+        with mock.patch.object(Book, 'from_db', side_effect=AssertionError):
+            with self.assertRaises(AssertionError):
+                serialize(Book.objects.all(),
+                    fields=['id', ('upper', lambda b: b.title.upper())])
+
+    def test_optimize_queryset(self):
+        """Test related lookups derived from a nested spec"""
+
+        fields = ['name', ('books', dict(
+            fields=['title', ('publisher', dict(fields=['name']))]))]
+        qs = optimize_queryset(Author.objects.all(), fields=fields)
+        with self.assertNumQueries(2):
+            s = serialize(qs, fields=fields)
+        self.assertEqual(s[0]['books'][0]['publisher'], {'name': 'Publisher'})
+
+        qs = optimize_queryset(Book.objects.all(),
+            include=[('author', dict(include=[('books', dict())]))])
+        self.assertEqual(qs.query.select_related, {'author': {}})
+        self.assertEqual([l.prefetch_to for l in qs._prefetch_related_lookups],
+            ['author__books'])
+
+    def test_serialize_chunks(self):
+        """Test chunked serialization of querysets and lists"""
+
+        chunks = list(serialize_chunks(Book.objects.all(), 4, fields=['title']))
+        self.assertEqual([len(c) for c in chunks], [4, 4, 2])
+        self.assertEqual(sum(chunks, []), serialize(Book.objects.all(),
+            fields=['title']))
+
+        fields = ['name', ('books', dict(fields=['title']))]
+        qs = optimize_queryset(Author.objects.all(), fields=fields)
+        with self.assertNumQueries(2):
+            chunks = list(serialize_chunks(qs, 10, fields=fields))
+        self.assertEqual(len(chunks[0][0]['books']), 10)
+
+        self.assertEqual(list(serialize_chunks(self.books, 6, fields=['id'])),
+            [[{'id': b.id} for b in self.books[:6]],
+             [{'id': b.id} for b in self.books[6:]]])
+
+    def test_serialize_batch_field(self):
+        """Test that batched field functions run once per list"""
+
+        calls = []
+
+        def price_rank(books):
+            calls.append(len(books))
+            ordered = sorted(books, key=lambda b: b.isbn, reverse=True)
+            return dict((b, i) for i, b in enumerate(ordered))
+
+        s = serialize(Book.objects.all(), fields=['isbn',
+            ('rank', batch(price_rank))])
+        self.assertEqual(calls, [10])
+        self.assertEqual(s[0]['rank'], 9)
+        self.assertEqual(s[9]['rank'], 0)
+
+        s = serialize(self.books[0], fields=[('rank', batch(price_rank))])
+        self.assertEqual(s, {'rank': 0})
+
+        chunks = list(serialize_chunks(Book.objects.all(), 4,
+            fields=[('rank', batch(price_rank))]))
+        self.assertEqual(calls, [10, 1, 4, 4, 2])
+        # Ranked within each chunk
+        self.assertEqual(chunks[0], [{'rank': 3}, {'rank': 2}, {'rank': 1},
+            {'rank': 0}])
+        self.assertEqual(chunks[2], [{'rank': 1}, {'rank': 0}])
+
+    def test_serialize_nested_batch_field(self):
+        """Test that nested batched fields run once for all the parents"""
+
+        for i in range(3):
+            author = Author.objects.create(name='Author %d' % i)
+            author.books.create(title='Book', isbn='%d' % i,
+                price=Decimal('1.0'), publisher=self.publisher)
+
+        calls = []
+
+        def publisher_names(books):
+            calls.append(len(books))
+            publishers = Publisher.objects.in_bulk(
+                set(b.publisher_id for b in books))
+            return dict((b, publishers[b.publisher_id].name) for b in books)
+
+        fields = ['name', ('books', dict(fields=['isbn',
+            ('publisher_name', batch(publisher_names))]))]
+        qs = optimize_queryset(Author.objects.all(), fields=fields)
+        with self.assertNumQueries(3):
+            s = serialize(qs, fields=fields)
+        self.assertEqual(calls, [13])
+        self.assertEqual(len(s[0]['books']), 10)
+        self.assertEqual(s[1]['books'],
+            [{'isbn': '0', 'publisher_name': 'Publisher'}])
+
+        s = serialize(qs, fields=fields, columnar=True)
+        self.assertEqual(calls, [13, 13])
+        self.assertEqual(s['rows'][3][1],
+            [{'isbn': '2', 'publisher_name': 'Publisher'}])
+
+        fields = ['isbn', ('author', dict(fields=['name',
+            ('count', batch(lambda authors: dict((a, len(authors))
+                for a in authors)))]))]
+        s = serialize(Book.objects.select_related('author'), fields=fields)
+        self.assertEqual(s[0]['author'], {'name': 'User Foo', 'count': 13})
+
+    def test_serialize_batch_field_missing(self):
+        s = serialize(self.books[:2], fields=['id', ('x', batch(lambda objs: {}))])
+        self.assertEqual(s[1], {'id': self.books[1].id, 'x': None})
+
+    def test_serialize_tuple_and_generator(self):
+        """Test that tuples and generators are serialized item by item"""
+
+        s = serialize((self.author, 1))
+        self.assertEqual(s, [serialize(self.author), 1])
+
+        s = serialize(b for b in self.books[:2])
+        self.assertTrue(isinstance(s, types.GeneratorType))
+        self.assertEqual(list(s), serialize(self.books[:2]))
+
+    def test_register_serializer(self):
+        """Test serialization of custom types through registered handlers"""
+
+        class Point(object):
+            def __init__(self, x, y):
+                self.x, self.y = x, y
+
+        class Point3D(Point):
+            pass
+
+        def point(obj, spec):
+            return {'x': obj.x, 'y': spec.serialize(obj.y)}
+
+        self.assertIs(serialize(Point(1, 2)).__class__, Point)
+        register_serializer(Point, point)
+        try:
+            self.assertEqual(serialize([Point(1, 2), Point3D(3, self.author)],
+                fields=['name']), [
+                    {'x': 1, 'y': 2},
+                    {'x': 3, 'y': {'name': 'User Foo'}},
+                ])
+        finally:
+            utils._serializers.pop(Point)
+            utils._handlers.clear()
+
+    def test_field_converters(self):
+        """Test the converters chosen for model field classes"""
+
+        field = Book._meta.get_field
+        self.assertIs(get_field_converter(field('id')), None)
+        self.assertIs(get_field_converter(field('author')), None)
+        self.assertEqual(get_field_converter(field('title'))(None), None)
+        self.assertEqual(get_field_converter(field('title'))(ugettext_lazy('x')), 'x')
+
+        class Level(object):
+            def __init__(self, value):
+                self.value = value
+
+            def __str__(self):
+                return 'level %d' % self.value
+
+        class LevelField(models.IntegerField):
+            def from_db_value(self, value, expression, connection, context):
+                return Level(value)
+
+        class Title(models.CharField):
+            pass
+
+        converter = get_field_converter(LevelField())
+        self.assertEqual(converter(Level(3)), 'level 3')
+        self.assertIs(get_field_converter(models.PositiveIntegerField()), None)
+        self.assertEqual(get_field_converter(Title())(ugettext_lazy('x')), 'x')
+
+    def test_converted_output_matches_encoder(self):
+        """Test that converted values encode to the same JSON as before"""
+
+        user = get_user_model().objects.create_user('foo')
+        token = Token.objects.create(user=user)
+        expected = {
+            'key': token.key,
+            'created': token.created,
+            'user': user.pk,
+        }
+        self.assertEqual(serialize(token), expected)
+        self.assertEqual(serialize(Token.objects.all()), [expected])
+        content = JSONResponse(serialize(token)).content
+        self.assertEqual(json.loads(content.decode('utf-8')),
+            json.loads(DjangoJSONEncoder().encode(expected)))
+
+    def test_fixup_receives_datetime(self):
+        """Test that dates are left for the encoders to format"""
+
+        def fixup(obj, data):
+            self.assertIsInstance(data['modified'], datetime.datetime)
+            return data
+
+        serialize(self.publisher, fields=['modified'], fixup=fixup)
+        serialize(Publisher.objects.all(), fields=['modified'], fixup=fixup)
+
+    def test_decimal_format(self):
+        book = Book.objects.get(pk=self.books[0].pk)
+        self.assertEqual(serialize(book, fields=['price']),
+            {'price': Decimal('10.00')})
+        with self.settings(RESTICUS={'DECIMAL_FORMAT': 'string'}):
+            self.assertEqual(serialize(book, fields=['price']),
+                {'price': '10.00'})
+            self.assertEqual(serialize(Book.objects.all()[:1], fields=['price']),
+                [{'price': '10.00'}])
+        with self.settings(RESTICUS={'DECIMAL_FORMAT': 'number'}):
+            self.assertEqual(serialize(book, fields=['price']),
+                {'price': 10.0})
+
+    def test_identity_map(self):
+        """Test that repeated related objects are serialized once"""
+
+        calls = []
+
+        def tagged(author):
+            calls.append(author.pk)
+            return author.name
+
+        fields = ['title', ('author', dict(fields=[('tag', tagged)]))]
+        books = list(Book.objects.select_related('author'))
+
+        s = serialize(books, fields=fields)
+        self.assertEqual(len(calls), 10)
+        self.assertIsNot(s[0]['author'], s[1]['author'])
+
+        del calls[:]
+        s = serialize(books, fields=fields, identity_map=True)
+        self.assertEqual(calls, [self.author.pk])
+        self.assertIs(s[0]['author'], s[1]['author'])
+        self.assertEqual(s[1], {'title': 'Book 1', 'author': {'tag': 'User Foo'}})
+
+        # The identity map is scoped to a single call
+        del calls[:]
+        serialize(books, fields=fields, identity_map=True)
+        self.assertEqual(calls, [self.author.pk])
+
+        del calls[:]
+        chunks = list(serialize_chunks(books, 3, fields=fields,
+            identity_map=True))
+        self.assertEqual(calls, [self.author.pk])
+        self.assertEqual(sum(chunks, []), s)
+
+    def test_serialize_columnar(self):
+        """Test the columnar output of list serialization"""
+
+        expected = {
+            'columns': ['id', 'title'],
+            'rows': [[b.id, b.title] for b in self.books],
+        }
+        self.assertEqual(serialize(Book.objects.all(), fields=['id', 'title'],
+            columnar=True), expected)
+        self.assertEqual(serialize(self.books, fields=['id', 'title'],
+            columnar=True), expected)
+        self.assertEqual(serialize(Book.objects.none(), fields=['id', 'title'],
+            columnar=True), {'columns': ['id', 'title'], 'rows': []})
+
+        def fixup(obj, data):
+            data['upper'] = data.pop('title').upper()
+            return data
+
+        s = serialize(self.books[:2], fields=['id', 'title'], fixup=fixup,
+            columnar=True)
+        self.assertEqual(s, {
+            'columns': ['id', 'upper'],
+            'rows': [[self.books[0].id, 'BOOK 0'], [self.books[1].id, 'BOOK 1']],
+        })
+
+        # Only sequences are affected
+        self.assertEqual(serialize(self.author, fields=['id'], columnar=True),
+            {'id': self.author.id})
+
+    def test_serialize_chunks_columnar(self):
+        chunks = list(serialize_chunks(Book.objects.all(), 4,
+            fields=['id', ('upper', lambda b: b.title.upper())], columnar=True))
+        self.assertEqual(chunks[0][1], [self.books[1].id, 'BOOK 1'])
+        self.assertEqual(get_columns(Book, fields=['id',
+            ('upper', lambda b: b.title.upper())]), ['id', 'upper'])
+        self.assertEqual(get_columns(Book, fields=['id'], fixup=flatten('x')),
+            None)
+
+    def test_parse_field_selection(self):
+        self.assertEqual(parse_field_selection('id, books(title,publisher(name)),x'),
+            {'id': None, 'books': {'title': None, 'publisher': {'name': None}},
+             'x': None})
+        for value in ('a(b', 'a)', '(a)', 'a,(b)'):
+            with self.assertRaises(ValueError):
+                parse_field_selection(value)
+
+    def test_narrow_fields(self):
+        """Test narrowing a spec down to a field selection"""
+
+        fields = ['id', 'name', ('books', dict(exclude=['price'])),
+            ('upper', lambda a: a.name.upper())]
+        self.assertEqual(narrow_fields(Author, {'name': None, 'nope': None},
+            fields), ['name'])
+
+        narrowed = narrow_fields(Author, parse_field_selection(
+            'books(title,price),id'), fields)
+        self.assertEqual(narrowed, ['id', ('books', {'fixup': None,
+            'fields': ['title']})])
+
+        self.assertEqual(narrow_fields(Author, {'comment': None, 'id': None}),
+            ['id', 'comment'])
+
+    def test_optimize_queryset_only(self):
+        qs = optimize_queryset(Book.objects.all(), fields=['title',
+            ('publisher', dict(fields=['name']))])
+        self.assertEqual(qs.query.deferred_loading,
+            ({'title', 'publisher'}, False))
+
+        # Specs reading arbitrary attributes load the whole rows
+        qs = optimize_queryset(Book.objects.all(), fields=['title',
+            ('upper', lambda b: b.title.upper())])
+        self.assertEqual(qs.query.deferred_loading, (set(), True))
+
+        qs = optimize_queryset(Book.objects.defer('isbn'), fields=['title'])
+        self.assertEqual(qs.query.deferred_loading, ({'isbn'}, True))
+
+    def test_raw_json_passthrough(self):
+        raw = RawJSON(b'{"cached": true}')
+        self.assertEqual(serialize({'data': [raw]}), {'data': [raw]})
+        r = JSONResponse({'data': [raw]})
+        self.assertEqual(r.content, b'{"data": [{"cached": true}]}')
@@ -14,3 +14,12 @@ class TestSettings(TestCase):
         })
         with self.assertRaises(ImportError):
             settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    def test_override_settings_updates_shared_instance(self):
+        """
+        Make sure modules holding a reference to api_settings see changes.
+        """
+        from resticus.settings import api_settings
+        with self.settings(RESTICUS={'DECIMAL_FORMAT': 'string'}):
+            self.assertEqual(api_settings.DECIMAL_FORMAT, 'string')
+        self.assertEqual(api_settings.DECIMAL_FORMAT, None)
@@ -5,6 +5,7 @@ __all__ = ['Author', 'Book', 'Publisher']
 
 class Publisher(models.Model):
     name = models.CharField(max_length=255)
+    modified = models.DateTimeField(auto_now=True)
 
 
 
@@ -4,7 +4,10 @@ from resticus.views import SessionAuthEndpoint, TokenAuthEndpoint
 from .views import (
                         AuthorList,
                         AuthorDetail,
+                        AuthorBookList,
+                        StreamingAuthorBookList,
                         BookDetail,
+                        BookList,
                         BasicAuthEndpoint,
                         PublisherDetail,
                         PublisherList,
@@ -12,9 +15,13 @@ from .views import (
                    )
 
 from .views import (
+                        BatchView,
+                        CookieView,
                         FailsIntentionally,
+                        ThreadedBatchView,
                         EchoView,
                         ErrorRaisingView,
+                        VersionedView,
                         WildcardHandler,
                    )
 
@@ -28,6 +35,10 @@ urlpatterns = [
 
     url(r'^authors/$', AuthorList.as_view(),
         name='author_list'),
+    url(r'^authors/books/$', AuthorBookList.as_view(),
+        name='author_book_list'),
+    url(r'^authors/books/stream/$', StreamingAuthorBookList.as_view(),
+        name='streaming_author_book_list'),
     url(r'^authors/(?P<author_id>\d+)$', AuthorDetail.as_view(),
         name='author_detail'),
 
@@ -38,6 +49,8 @@ urlpatterns = [
     url(r'^publishers/(?P<pk>\d+)$', PublisherDetail.as_view(),
         name='publisher_detail'),
 
+    url(r'^books/$', BookList.as_view(),
+        name='book_list'),
     url(r'^books/(?P<isbn>\d+)$', BookDetail.as_view(),
         name='book_detail'),
 
@@ -47,5 +60,13 @@ urlpatterns = [
         name='echo_view'),
     url(r'^error-raising-view/$', ErrorRaisingView.as_view(),
         name='error_raising_view'),
+    url(r'^cookie-view/$', CookieView.as_view(),
+        name='cookie_view'),
+    url(r'^versioned-view/$', VersionedView.as_view(),
+        name='versioned_view'),
+    url(r'^batch/$', BatchView.as_view(),
+        name='batch_view'),
+    url(r'^batch/threaded/$', ThreadedBatchView.as_view(),
+        name='threaded_batch_view'),
     url(r'^.*$', WildcardHandler.as_view()),
 ]
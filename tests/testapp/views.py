@@ -1,9 +1,10 @@
 import base64
 
 from resticus import generics
-from resticus.auth import login_required, BasicHttpAuth
+from resticus.auth import login_required, BasicHttpAuth, SessionAuth
+from resticus.batch import BatchEndpoint
 from resticus.exceptions import HttpError
-from resticus.http import Http201, Http403, Http404, Http400
+from resticus.http import Http200, Http201, Http403, Http404, Http400
 from resticus.utils import serialize
 from resticus.views import Endpoint
 
@@ -13,7 +14,10 @@ from .forms import *
 __all__ =  [
             'AuthorList',
             'AuthorDetail',
+            'AuthorBookList',
             'BookDetail',
+            'BookList',
+            'StreamingAuthorBookList',
             'PublisherList',
             'PublisherDetail',
             'ReadOnlyPublisherList',
@@ -23,7 +27,11 @@ __all__ += [
             'BasicAuthEndpoint'
             'EchoView',
             'ErrorRaisingView',
+            'VersionedView',
             'FailsIntentionally',
+            'BatchView',
+            'CookieView',
+            'ThreadedBatchView',
             'WildcardHandler',
           ]
 
@@ -39,18 +47,37 @@ class AuthorDetail(generics.DetailUpdateDeleteEndpoint):
     lookup_url_kwarg = 'author_id'
 
 
+class AuthorBookList(generics.ListEndpoint):
+    model = Author
+    fields = ('id', 'name', ('books', dict(
+        fields=('title', 'isbn', ('publisher', dict(fields=('name',))))
+    )))
+
+
+class StreamingAuthorBookList(AuthorBookList):
+    streaming = True
+    chunk_size = 2
+
+
 class PublisherList(generics.ListCreateEndpoint):
     model = Publisher
+    last_modified_field = 'modified'
 
 
 class PublisherDetail(generics.DetailUpdateDeleteEndpoint):
     model = Publisher
+    last_modified_field = 'modified'
 
 
 class ReadOnlyPublisherList(generics.DetailEndpoint):
     model = Publisher
 
 
+class BookList(generics.ListEndpoint):
+    model = Book
+    fields = ('id', 'title', 'isbn', 'author', 'publisher', 'price')
+
+
 class BookDetail(generics.DetailEndpoint):
     model = Book
     lookup_field = 'isbn'
@@ -86,6 +113,36 @@ class ErrorRaisingView(Endpoint):
         raise HttpError(400, 'raised error')
 
 
+class CookieView(Endpoint):
+    def post(self, request):
+        response = Http200({})
+        response.set_cookie('flavour', 'oat')
+        response.set_cookie('size', 'large', httponly=True)
+        return response
+
+
+class VersionedView(Endpoint):
+    version = 'v1'
+    calls = 0
+
+    def get_etag(self, request):
+        return self.version
+
+    def get(self, request):
+        VersionedView.calls += 1
+        return {'version': self.version}
+
+
+class BatchView(BatchEndpoint):
+    authentication_classes = (SessionAuth,)
+    max_requests = 5
+
+
+class ThreadedBatchView(BatchEndpoint):
+    max_requests = 5
+    workers = 2
+
+
 class BasicAuthEndpoint(Endpoint):
     authentication_classes = (BasicHttpAuth,)
 